@@ -2,463 +2,3462 @@
 """
 EXIF Metadata CLI Tool
 A command-line tool to read and optionally remove image generation metadata from image files.
+
+Can also be imported as a library:
+
+    import PromptSniffer
+    result = PromptSniffer.scan("image.png")           # path, bytes or binary file object
+    result = await PromptSniffer.scan_async(upload_bytes)
+    print(result.ai_generated, result.keywords, result.to_dict())
 """
 
+import abc
 import argparse
+import collections
+import contextlib
+import fnmatch
+import functools
 import glob
+import heapq
+import io
+import itertools
+import mmap
 import os
+import queue
+import re
+import signal
+import stat
+import struct
 import sys
-from pathlib import Path
-from typing import List, Dict, Any
+import threading
+import time
+import zlib
+from typing import List, Dict, Any, BinaryIO, Callable, Iterable, Iterator, Optional, Set, Tuple, Union
 
-try:
-    from PIL import Image
-    from PIL.ExifTags import TAGS
-    import exifread
-except ImportError as e:
-    print(f"Error: Required libraries not installed. Please run:")
-    print("pip install Pillow ExifRead")
-    sys.exit(1)
+# Pillow and ExifRead are imported on first use: PNG text chunks, JPEG segments and lossless
+# stripping are handled without them, which keeps context-menu invocations fast to start
+MISSING_LIBRARIES = "Required libraries not installed. Please run: pip install Pillow ExifRead"
 
 
-class ExifMetadataProcessor:
-    """Process EXIF metadata for images"""
+def load_pillow_image():
+    """PIL.Image, imported on first use"""
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise ImportError(MISSING_LIBRARIES) from e
+    return Image
+
+
+def load_exifread():
+    """The exifread module, imported on first use"""
+    try:
+        import exifread
+    except ImportError as e:
+        raise ImportError(MISSING_LIBRARIES) from e
+    return exifread
+
+
+@functools.lru_cache(maxsize=None)
+def exif_tag_tables() -> Tuple[Dict[int, str], Dict[str, int], Dict[str, int]]:
+    """Pillow's EXIF tag names and the reverse lookups (EXIF and GPS name -> tag id)"""
+    try:
+        from PIL.ExifTags import TAGS, GPSTAGS
+    except ImportError as e:
+        raise ImportError(MISSING_LIBRARIES) from e
+    return (TAGS,
+            {name: tag_id for tag_id, name in TAGS.items()},
+            {name: tag_id for tag_id, name in GPSTAGS.items()})
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG chunks that carry textual/EXIF metadata; everything else is skipped by seeking
+PNG_TEXT_CHUNKS = frozenset({b'tEXt', b'zTXt', b'iTXt'})
+PNG_METADATA_CHUNKS = PNG_TEXT_CHUNKS | {b'eXIf'}
+# PNG chunk holding C2PA (Content Credentials) JUMBF manifests
+PNG_C2PA_CHUNK = b'caBX'
+# Chunks dropped by lossless PNG stripping
+PNG_STRIP_CHUNKS = PNG_METADATA_CHUNKS | {PNG_C2PA_CHUNK}
+
+
+# Default resource limits for untrusted input; 0 disables a limit
+DEFAULT_MAX_METADATA_MB = 64
+DEFAULT_MAX_CHUNK_MB = 16
+DEFAULT_MAX_PIXELS = 100_000_000
+
+
+class LimitExceeded(Exception):
+    """A file needs more memory than the configured limits allow; it is skipped, not failed"""
+
+
+SKIPPED_PREFIX = 'skipped: '
+
+
+def describe_error(e: Exception) -> str:
+    """Error text for a file's record; files over the limits are marked as skipped"""
+    return SKIPPED_PREFIX + str(e) if isinstance(e, LimitExceeded) else str(e)
+
+
+def iter_png_chunks(f: BinaryIO, wanted: frozenset = PNG_METADATA_CHUNKS,
+                    max_bytes: int = 0) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield (chunk_type, data) for wanted PNG chunks, seeking past all others (IDAT is never read)
     
-    # Common AI/generation related tags to look for
-    AI_GENERATION_TAGS = [
-        'Software',
-        'ImageDescription', 
-        'UserComment',
-        'Artist',
-        'Copyright',
-        'ProcessingSoftware',
-        'OriginalRawFileName',
-        'DocumentName',
-        # PNG-specific text chunks commonly used by AI tools
-        'parameters',
-        'prompt',
-        'negative_prompt', 
-        'workflow',
-        'Comment',
-        'Description',
-        'Title',
-        'Author',
-        'Software',
-        'Creation Time',
-        'Source'
-    ]
+    max_bytes caps the total size of the wanted chunks; LimitExceeded is raised before
+    reading a chunk that would go over it.
+    """
+    remaining = max_bytes
+    if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("not a PNG file")
     
-    # Keywords that might indicate AI generation
-    AI_KEYWORDS = [
-        'stable diffusion',
-        'midjourney', 
-        'dall-e',
-        'dalle',
-        'ai generated',
-        'artificial intelligence',
-        'neural network',
-        'gan',
-        'diffusion',
-        'automatic1111',
-        'invokeai',
-        'comfyui',
-	'prompt',
-        'novelai',
-        'swarmui',
-        'stableswarmui',
-        'stable swarm ui'
-    ]
+    first = True
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return  # Truncated file, keep what we have
+        length, chunk_type = struct.unpack('>I4s', header)
+        if first and chunk_type != b'IHDR':
+            raise ValueError("corrupt PNG: first chunk is not IHDR")
+        first = False
+        if chunk_type == b'IEND':
+            return
+        
+        if chunk_type in wanted:
+            if max_bytes:
+                remaining -= length
+                if remaining < 0:
+                    raise LimitExceeded(f"metadata chunks exceed {max_bytes:,} bytes")
+            data = f.read(length)
+            if len(data) < length:
+                return
+            f.seek(4, os.SEEK_CUR)  # Skip CRC
+            yield chunk_type, data
+        else:
+            f.seek(length + 4, os.SEEK_CUR)  # Skip chunk data and CRC
 
-    def __init__(self):
-        self.supported_formats = {'.jpg', '.jpeg', '.tiff', '.tif', '.png'}
+
+def inflate_limited(data: bytes, max_size: int = 0) -> bytes:
+    """zlib-decompress data, stopping with LimitExceeded once the output passes max_size bytes"""
+    if not max_size:
+        return zlib.decompress(data)
+    decompressor = zlib.decompressobj()
+    output = decompressor.decompress(data, max_size + 1)  # Never inflates more than this
+    if len(output) > max_size:
+        raise LimitExceeded(f"compressed text chunk inflates beyond {max_size:,} bytes")
+    return output + decompressor.flush()
+
+
+def decode_png_text_chunk(chunk_type: bytes, data: bytes, max_size: int = 0,
+                          keys: Optional[Set[str]] = None) -> Optional[Tuple[str, str]]:
+    """Decode a tEXt/zTXt/iTXt chunk into (keyword, text), or None if malformed
     
-    def get_unique_filename(self, base_path: str) -> str:
-        """Generate a unique filename by adding _1, _2, etc. if file exists"""
-        if not os.path.exists(base_path):
-            return base_path
+    max_size caps the decompressed size of zTXt/iTXt text (see inflate_limited).
+    With keys, chunks with other keywords are skipped (None) without decompressing them.
+    """
+    try:
+        keyword, rest = data.split(b'\0', 1)
+        key = keyword.decode('latin-1')
+        if keys is not None and key not in keys:
+            return None
         
-        # Split the path into directory, filename, and extension
-        directory = os.path.dirname(base_path)
-        filename = os.path.basename(base_path)
-        name, ext = os.path.splitext(filename)
+        if chunk_type == b'tEXt':
+            return key, rest.decode('latin-1', 'replace')
         
-        counter = 1
-        while True:
-            new_filename = f"{name}_{counter}{ext}"
-            new_path = os.path.join(directory, new_filename)
-            if not os.path.exists(new_path):
-                return new_path
-            counter += 1
+        if chunk_type == b'zTXt':
+            # rest[0] is the compression method, only zlib (0) is defined
+            return key, inflate_limited(rest[1:], max_size).decode('latin-1', 'replace')
+        
+        if chunk_type == b'iTXt':
+            compressed, _method = rest[0], rest[1]
+            _language, rest = rest[2:].split(b'\0', 1)
+            _translated_key, text = rest.split(b'\0', 1)
+            if compressed:
+                text = inflate_limited(text, max_size)
+            return key, text.decode('utf-8', 'replace')
+    except (ValueError, IndexError, zlib.error):
+        pass
     
-    def is_json_format(self, text: str) -> bool:
-        """Check if text is valid JSON format"""
-        try:
-            import json
-            json.loads(text)
-            return True
-        except (json.JSONDecodeError, TypeError):
-            return False
+    return None
+
+
+# JPEG markers that stand alone without a length field
+JPEG_STANDALONE_MARKERS = frozenset({0x01} | set(range(0xD0, 0xD8)))
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+JPEG_APP1 = 0xE1
+JPEG_APP11 = 0xEB  # C2PA JUMBF manifests
+EXIF_HEADER = b'Exif\x00\x00'
+
+# exifread IFD prefixes whose tags Pillow's _getexif() merged into one flat dict
+PILLOW_MERGED_IFDS = ('Image', 'EXIF')
+
+
+def iter_jpeg_segments(f: BinaryIO) -> Iterator[Tuple[int, int, int]]:
+    """Yield (marker, payload offset, payload length) for each JPEG header segment
     
-    def copy_to_clipboard(self, text: str) -> bool:
-        """Copy text to clipboard using cross-platform method"""
-        try:
-            # Try Windows first
-            import win32clipboard
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
-            win32clipboard.CloseClipboard()
-            return True
-        except ImportError:
-            try:
-                # Try pyperclip as fallback
-                import pyperclip
-                pyperclip.copy(text)
-                return True
-            except ImportError:
-                try:
-                    # Try using subprocess for cross-platform support
-                    import subprocess
-                    if sys.platform.startswith('win'):
-                        # Windows - use clip command
-                        process = subprocess.Popen(['clip'], stdin=subprocess.PIPE, text=True)
-                        process.communicate(input=text)
-                        return process.returncode == 0
-                    elif sys.platform.startswith('darwin'):
-                        # macOS - use pbcopy
-                        process = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE, text=True)
-                        process.communicate(input=text)
-                        return process.returncode == 0
-                    elif sys.platform.startswith('linux'):
-                        # Linux - try xclip or xsel
-                        try:
-                            process = subprocess.Popen(['xclip', '-selection', 'clipboard'], stdin=subprocess.PIPE, text=True)
-                            process.communicate(input=text)
-                            return process.returncode == 0
-                        except FileNotFoundError:
-                            try:
-                                process = subprocess.Popen(['xsel', '--clipboard', '--input'], stdin=subprocess.PIPE, text=True)
-                                process.communicate(input=text)
-                                return process.returncode == 0
-                            except FileNotFoundError:
-                                return False
-                except Exception:
-                    return False
-        except Exception:
-            return False
-        
-        return False
+    Only marker headers are read; the caller may read the payload, and the next
+    segment is found by seeking past it. Stops at the start of scan data.
+    """
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError("not a JPEG file")
     
-    def copy_ai_metadata_to_clipboard(self, ai_metadata: Dict[str, Any]) -> bool:
-        """Copy AI generation metadata to clipboard in appropriate format"""
-        if not ai_metadata:
-            print("No AI metadata found to copy")
-            return False
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return
+        if byte != b'\xff':
+            return  # Lost sync with the marker stream
         
-        try:
-            # Check for ComfyUI workflow first
-            comfyui_workflow = None
-            
-            for tag, value in ai_metadata.items():
-                value_str = str(value)
-                if ('workflow' in tag.lower() or 'comfy' in tag.lower()) and self.is_json_format(value_str):
-                    try:
-                        import json
-                        parsed_json = json.loads(value_str)
-                        # Check if it looks like a ComfyUI workflow
-                        if isinstance(parsed_json, dict) and ('nodes' in parsed_json or any(isinstance(v, dict) and 'class_type' in v for v in parsed_json.values())):
-                            comfyui_workflow = parsed_json
-                            break
-                    except:
-                        continue
-            
-            if comfyui_workflow:
-                # Copy ComfyUI workflow as properly formatted JSON
-                import json
-                workflow_json = json.dumps(comfyui_workflow, indent=2, ensure_ascii=False)
-                if self.copy_to_clipboard(workflow_json):
-                    print("✓ ComfyUI workflow copied to clipboard")
-                    print("  Can be pasted directly into ComfyUI")
-                    return True
-                else:
-                    print("✗ Failed to copy to clipboard")
-                    return False
-            
-            # Check for other JSON content
-            for tag, value in ai_metadata.items():
-                value_str = str(value)
-                if self.is_json_format(value_str):
-                    try:
-                        import json
-                        parsed_json = json.loads(value_str)
-                        formatted_json = json.dumps(parsed_json, indent=2, ensure_ascii=False)
-                        if self.copy_to_clipboard(formatted_json):
-                            print(f"✓ JSON metadata from '{tag}' copied to clipboard")
-                            return True
-                    except:
-                        continue
-            
-            # If no JSON found, copy all metadata as formatted text
-            text_content = []
-            for tag, value in ai_metadata.items():
-                text_content.append(f"{tag}: {value}")
-            
-            combined_text = "\n".join(text_content)
-            if self.copy_to_clipboard(combined_text):
-                print("✓ AI generation metadata copied to clipboard")
-                return True
-            else:
-                print("✗ Failed to copy to clipboard")
-                return False
-                
-        except Exception as e:
-            print(f"✗ Error copying metadata to clipboard: {e}")
-            return False
+        marker = f.read(1)
+        while marker == b'\xff':  # Fill bytes
+            marker = f.read(1)
+        if not marker:
+            return
+        marker = marker[0]
+        
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            return  # Entropy-coded data follows, no metadata past this point
+        
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return
+        offset = f.tell()
+        length = struct.unpack('>H', length_bytes)[0] - 2
+        yield marker, offset, length
+        f.seek(offset + length)
+
+
+def locate_jpeg_exif(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """Find a JPEG's APP1 EXIF payload, reading headers only; returns (offset, length) or None"""
+    for marker, offset, length in iter_jpeg_segments(f):
+        if marker == JPEG_APP1 and length >= len(EXIF_HEADER) and f.read(len(EXIF_HEADER)) == EXIF_HEADER:
+            return offset + len(EXIF_HEADER), length - len(EXIF_HEADER)
+    return None
+
+
+def read_jpeg_exif_payload(f: BinaryIO) -> Optional[bytes]:
+    """Return the TIFF-structured EXIF payload of a JPEG's APP1 segment, reading headers only"""
+    location = locate_jpeg_exif(f)
+    if location is None:
+        return None
+    offset, length = location
+    f.seek(offset)
+    return f.read(length)
+
+
+def read_jpeg_metadata_segments(f: BinaryIO, c2pa: bool = True,
+                                max_bytes: int = 0) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """(EXIF payload, concatenated APP11 JUMBF payloads) of a JPEG, reading headers only
     
-    def save_ai_metadata_to_file(self, image_filepath: str, ai_metadata: Dict[str, Any]) -> bool:
-        """Save AI generation metadata to separate file"""
-        if not ai_metadata:
-            print(f"No AI metadata found in {image_filepath} to save")
-            return False
+    Raises LimitExceeded if max_bytes is set and the APP11 segments add up to more.
+    """
+    exif = None
+    jumbf = []
+    jumbf_bytes = 0
+    for marker, offset, length in iter_jpeg_segments(f):
+        if marker == JPEG_APP1 and exif is None and length >= len(EXIF_HEADER):
+            payload = f.read(length)
+            if payload.startswith(EXIF_HEADER):
+                exif = payload[len(EXIF_HEADER):]
+                if not c2pa:
+                    break
+        elif marker == JPEG_APP11 and c2pa:
+            jumbf_bytes += length
+            if max_bytes and jumbf_bytes > max_bytes:
+                raise LimitExceeded(f"APP11 segments exceed {max_bytes:,} bytes")
+            jumbf.append(f.read(length))
+    return exif, b''.join(jumbf) or None
+
+
+# Byte size of each TIFF field type, used to find out-of-line tag values
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+# Pointer tags to the EXIF, GPS and Interoperability sub-IFDs
+EXIF_IFD_TAG = 0x8769
+EXIF_SUB_IFD_TAGS = frozenset({EXIF_IFD_TAG, 0x8825, 0xA005})
+# Where A1111 and others write generation parameters in JPEG/PNG EXIF
+USER_COMMENT_TAG = 0x9286
+
+
+def filter_ifd_tags(buf: Any, drop: Set[int], tiff_start: int = 0) -> int:
+    """Remove tags from IFD0 and its EXIF/GPS/Interop sub-IFDs in place; returns the number removed
+    
+    buf is any writable buffer (bytearray, mmap) holding a TIFF structure at tiff_start.
+    Kept entries are compacted within each IFD's existing table and the values of
+    removed tags are zeroed, so no other offset in the file has to change. Every IFD
+    table and wiped value is checked against len(buf) first; a ValueError leaves buf
+    untouched.
+    """
+    size_limit = len(buf)
+    
+    def check_range(start: int, end: int, what: str):
+        if start < 0 or end > size_limit:
+            raise ValueError(f"{what} at {start}-{end} lies outside the {size_limit}-byte EXIF block")
+    
+    check_range(tiff_start, tiff_start + 8, "TIFF header")
+    byte_order = bytes(buf[tiff_start:tiff_start + 2])
+    if byte_order not in (b'II', b'MM'):
+        raise ValueError("invalid TIFF header")
+    endian = '<' if byte_order == b'II' else '>'
+    drop = set(drop) - EXIF_SUB_IFD_TAGS
+    
+    # Plan every change first, so a malformed block is rejected before anything is written
+    tables = []  # (table position, original table end, new table bytes)
+    wipes = []   # (value position, size)
+    removed = 0
+    pending = [struct.unpack(endian + 'I', buf[tiff_start + 4:tiff_start + 8])[0]]
+    visited = set()
+    while pending:
+        ifd_offset = pending.pop()
+        if not ifd_offset or ifd_offset in visited:
+            continue
+        visited.add(ifd_offset)
         
-        try:
-            # Get base filename without extension
-            base_name = os.path.splitext(image_filepath)[0]
-            
-            # Combine all AI metadata into a single structure
-            combined_metadata = {}
-            all_text = ""
-            
-            for tag, value in ai_metadata.items():
-                combined_metadata[tag] = str(value)
-                all_text += f"{tag}: {value}\n"
-            
-            # Check for ComfyUI workflow specifically
-            comfyui_workflow = None
-            is_comfyui_workflow = False
-            
-            # Look for ComfyUI workflow in metadata
-            for tag, value in ai_metadata.items():
-                value_str = str(value)
-                if ('workflow' in tag.lower() or 'comfy' in tag.lower()) and self.is_json_format(value_str):
-                    try:
-                        import json
-                        parsed_json = json.loads(value_str)
-                        # Check if it looks like a ComfyUI workflow (has nodes structure)
-                        if isinstance(parsed_json, dict) and ('nodes' in parsed_json or any(isinstance(v, dict) and 'class_type' in v for v in parsed_json.values())):
-                            comfyui_workflow = parsed_json
-                            is_comfyui_workflow = True
-                            print(f"🎨 Detected ComfyUI workflow in {tag}")
-                            break
-                    except:
-                        continue
-            
-            if is_comfyui_workflow and comfyui_workflow:
-                # Save as ComfyUI workflow JSON
-                json_filepath = f"{base_name}.json"
-                json_filepath = self.get_unique_filename(json_filepath)
-                
-                import json
-                with open(json_filepath, 'w', encoding='utf-8') as f:
-                    json.dump(comfyui_workflow, f, indent=2, ensure_ascii=False)
-                
-                print(f"💾 Saved ComfyUI workflow: {json_filepath}")
-                print(f"   ✓ Can be loaded directly in ComfyUI")
-                
-            else:
-                # Check if any other metadata values contain JSON
-                is_json_data = False
-                json_content = None
-                
-                # Look for other JSON-like content
-                for tag, value in ai_metadata.items():
-                    if self.is_json_format(str(value)):
-                        is_json_data = True
-                        import json
-                        json_content = {
-                            "source_file": os.path.basename(image_filepath),
-                            "metadata_tags": combined_metadata
-                        }
-                        break
-                
-                if is_json_data and json_content:
-                    # Save as general JSON file
-                    json_filepath = f"{base_name}.json"
-                    json_filepath = self.get_unique_filename(json_filepath)
-                    
-                    import json
-                    with open(json_filepath, 'w', encoding='utf-8') as f:
-                        json.dump(json_content, f, indent=2, ensure_ascii=False)
-                    
-                    print(f"💾 Saved AI metadata as JSON: {json_filepath}")
-                    
-                else:
-                    # Save as text file
-                    txt_filepath = f"{base_name}.txt"
-                    txt_filepath = self.get_unique_filename(txt_filepath)
-                    
-                    with open(txt_filepath, 'w', encoding='utf-8') as f:
-                        f.write(f"AI Generation Metadata for: {os.path.basename(image_filepath)}\n")
-                        f.write("=" * 50 + "\n\n")
-                        f.write(all_text)
-                    
-                    print(f"💾 Saved AI metadata as text: {txt_filepath}")
+        pos = tiff_start + ifd_offset
+        check_range(pos, pos + 2, "IFD")
+        count = struct.unpack(endian + 'H', buf[pos:pos + 2])[0]
+        table_end = pos + 2 + 12 * count
+        check_range(pos, table_end + 4, "IFD table")
+        kept = []
+        for entry_pos in range(pos + 2, table_end, 12):
+            entry = bytes(buf[entry_pos:entry_pos + 12])
+            tag, field_type, value_count, value = struct.unpack(endian + 'HHI4s', entry)
+            if tag in EXIF_SUB_IFD_TAGS:
+                pending.append(struct.unpack(endian + 'I', value)[0])
             
-            return True
+            if tag not in drop:
+                kept.append(entry)
+                continue
             
-        except Exception as e:
-            print(f"✗ Error saving metadata for {image_filepath}: {e}")
-            return False
+            removed += 1
+            size = TIFF_TYPE_SIZES.get(field_type, 1) * value_count
+            if size > 4:
+                # Out-of-line value: wipe it so the text doesn't linger in the file
+                data_pos = tiff_start + struct.unpack(endian + 'I', value)[0]
+                check_range(data_pos, data_pos + size, f"value of tag 0x{tag:04X}")
+                wipes.append((data_pos, size))
+        
+        if len(kept) < count:
+            next_ifd = bytes(buf[table_end:table_end + 4])
+            table = struct.pack(endian + 'H', len(kept)) + b''.join(kept) + next_ifd
+            tables.append((pos, table_end + 4, table))
     
-    def is_supported_format(self, filepath: str) -> bool:
-        """Check if file format is supported"""
-        return Path(filepath).suffix.lower() in self.supported_formats
+    for data_pos, size in wipes:
+        buf[data_pos:data_pos + size] = bytes(size)
+    for pos, end, table in tables:
+        buf[pos:end] = table + bytes(end - pos - len(table))
+    if len(buf) != size_limit:
+        raise AssertionError("IFD filtering changed the size of the EXIF block")
+    return removed
+
+
+def tiff_metadata_ranges(buf: Any, tiff_start: int = 0) -> List[Tuple[int, int]]:
+    """(start, end) byte ranges of the IFD tables and out-of-line tag values in a TIFF structure
     
-    def read_exif_data(self, filepath: str) -> Dict[str, Any]:
-        """Read EXIF data and PNG metadata from image file"""
-        exif_data = {}
-        
-        try:
-            with Image.open(filepath) as img:
-                # Read standard EXIF data (JPEG/TIFF)
-                if hasattr(img, '_getexif') and img._getexif() is not None:
-                    for tag_id, value in img._getexif().items():
-                        tag_name = TAGS.get(tag_id, tag_id)
-                        exif_data[tag_name] = value
-                
-                # Read PNG text chunks (PNG metadata)
-                if hasattr(img, 'text') and img.text:
-                    for key, value in img.text.items():
-                        exif_data[f"PNG.{key}"] = value
-            
-            # Use exifread for more detailed EXIF data (JPEG/TIFF only)
-            if not filepath.lower().endswith('.png'):
-                with open(filepath, 'rb') as f:
-                    detailed_tags = exifread.process_file(f, details=True)
-                    for tag, value in detailed_tags.items():
-                        if not tag.startswith('JPEGThumbnail'):
-                            exif_data[tag] = str(value)
-                        
-        except Exception as e:
-            print(f"Warning: Could not read metadata from {filepath}: {e}")
-            
-        return exif_data
+    Follows the IFD chain and the EXIF/GPS/Interop sub-IFDs. Strip and tile offset tables
+    are included but not the image data they point to.
+    """
+    byte_order = bytes(buf[tiff_start:tiff_start + 2])
+    if byte_order not in (b'II', b'MM'):
+        raise ValueError("invalid TIFF header")
+    endian = '<' if byte_order == b'II' else '>'
     
-    def find_ai_generation_metadata(self, exif_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Find potential AI generation metadata"""
-        ai_metadata = {}
-        
-        for tag, value in exif_data.items():
-            # Check if tag is in our list of AI-related tags
-            tag_name = tag.split('.')[-1] if '.' in tag else tag
-            if tag_name in self.AI_GENERATION_TAGS:
-                # Check if value contains AI-related keywords
-                value_str = str(value).lower()
-                if any(keyword in value_str for keyword in self.AI_KEYWORDS):
-                    ai_metadata[tag] = value
-                elif tag_name in ['Software', 'ProcessingSoftware']:
-                    # Include all software tags as they might indicate generation tools
-                    ai_metadata[tag] = value
-                elif len(str(value)) > 50:  # Long descriptions might be prompts
-                    ai_metadata[tag] = value
-            
-            # Special handling for JSON-like metadata (SwarmUI format)
-            value_str = str(value)
-            if (value_str.strip().startswith('{') and value_str.strip().endswith('}')) or \
-               ('prompt' in value_str.lower() and ('cfg' in value_str.lower() or 'steps' in value_str.lower())):
-                ai_metadata[tag] = value
+    ranges = [(tiff_start, tiff_start + 8)]
+    pending = [struct.unpack(endian + 'I', buf[tiff_start + 4:tiff_start + 8])[0]]
+    visited = set()
+    while pending:
+        ifd_offset = pending.pop()
+        pos = tiff_start + ifd_offset
+        if not ifd_offset or ifd_offset in visited or pos + 2 > len(buf):
+            continue
+        visited.add(ifd_offset)
         
-        return ai_metadata
+        count = struct.unpack(endian + 'H', buf[pos:pos + 2])[0]
+        table_end = min(pos + 2 + 12 * count, len(buf) - 4)
+        ranges.append((pos, table_end + 4))
+        for entry_pos in range(pos + 2, table_end, 12):
+            tag, field_type, value_count, value = struct.unpack(endian + 'HHI4s', buf[entry_pos:entry_pos + 12])
+            if tag in EXIF_SUB_IFD_TAGS:
+                pending.append(struct.unpack(endian + 'I', value)[0])
+            size = TIFF_TYPE_SIZES.get(field_type, 1) * value_count
+            if size > 4:
+                data_pos = tiff_start + struct.unpack(endian + 'I', value)[0]
+                ranges.append((data_pos, min(data_pos + size, len(buf))))
+        pending.append(struct.unpack(endian + 'I', buf[table_end:table_end + 4])[0])  # Next IFD
     
-    def display_metadata(self, filepath: str, exif_data: Dict[str, Any], ai_metadata: Dict[str, Any]):
-        """Display metadata information"""
-        print(f"\n{'='*60}")
-        print(f"File: {filepath}")
-        print(f"{'='*60}")
-        
-        if not exif_data:
+    return ranges
+
+
+def exif_ifd_value(buf: Any, tag: int, tiff_start: int = 0) -> Optional[bytes]:
+    """Raw value bytes of a tag in the EXIF sub-IFD of a TIFF structure, or None if absent"""
+    byte_order = bytes(buf[tiff_start:tiff_start + 2])
+    if byte_order not in (b'II', b'MM'):
+        return None
+    endian = '<' if byte_order == b'II' else '>'
+    
+    def find(ifd_offset: int, wanted: int) -> Optional[bytes]:
+        pos = tiff_start + ifd_offset
+        count = struct.unpack(endian + 'H', buf[pos:pos + 2])[0]
+        for entry_pos in range(pos + 2, pos + 2 + 12 * count, 12):
+            entry_tag, field_type, value_count, value = struct.unpack(endian + 'HHI4s', buf[entry_pos:entry_pos + 12])
+            if entry_tag != wanted:
+                continue
+            size = TIFF_TYPE_SIZES.get(field_type, 1) * value_count
+            if size <= 4:
+                return bytes(value[:size])
+            data_pos = tiff_start + struct.unpack(endian + 'I', value)[0]
+            return bytes(buf[data_pos:data_pos + size])
+        return None
+    
+    try:
+        pointer = find(struct.unpack(endian + 'I', buf[tiff_start + 4:tiff_start + 8])[0], EXIF_IFD_TAG)
+        if pointer is None or len(pointer) != 4:
+            return None
+        return find(struct.unpack(endian + 'I', pointer)[0], tag)
+    except struct.error:
+        return None  # Truncated IFD
+
+
+class FileSlices:
+    """Read-only buf[start:end] view of a seekable binary file, for parsers written against buffers"""
+    
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self._size = f.seek(0, os.SEEK_END)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __getitem__(self, index: slice) -> bytes:
+        start, stop, _ = index.indices(self._size)
+        self._f.seek(start)
+        return self._f.read(max(stop - start, 0))
+
+
+def tiff_metadata_size(f: BinaryIO) -> int:
+    """Bytes of IFD tables and tag values exifread would read from a TIFF file, without reading them"""
+    try:
+        ranges = tiff_metadata_ranges(FileSlices(f))
+    except (struct.error, ValueError):
+        ranges = []  # exifread reports the damage
+    finally:
+        f.seek(0)
+    return sum(max(end - start, 0) for start, end in ranges)
+
+
+# Segments dropped by lossless JPEG stripping: APP1 (EXIF/XMP), APP11 (C2PA), APP13 (IPTC/Photoshop), COM
+JPEG_METADATA_MARKERS = frozenset({JPEG_APP1, JPEG_APP11, 0xED, 0xFE})
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Identify an image container from its first bytes ('png', 'jpeg', 'tiff' or None)"""
+    if head.startswith(PNG_SIGNATURE):
+        return 'png'
+    if head.startswith(b'\xff\xd8'):
+        return 'jpeg'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    return None
+
+
+def sniff_file_format(filepath: str) -> Optional[str]:
+    """sniff_image_format() for a file on disk, or None if it can't be read"""
+    try:
+        with open(filepath, 'rb') as f:
+            return sniff_image_format(f.read(8))
+    except OSError:
+        return None
+
+
+def _copy_bytes(src: BinaryIO, dst: BinaryIO, count: int):
+    """Copy exactly count bytes from src to dst in bounded chunks"""
+    read = getattr(src, 'read_view', src.read)  # Memory-mapped sources are written without a copy
+    while count > 0:
+        chunk = read(min(count, COPY_BUFFER_SIZE))
+        if not chunk:
+            raise ValueError("unexpected end of file")
+        dst.write(chunk)
+        count -= len(chunk)
+
+
+def _copy_rest(src: BinaryIO, dst: BinaryIO):
+    """Copy everything from src's position to its end"""
+    read = getattr(src, 'read_view', src.read)
+    while True:
+        chunk = read(COPY_BUFFER_SIZE)
+        if not chunk:
+            return
+        dst.write(chunk)
+
+
+def strip_png_chunks(src: BinaryIO, dst: BinaryIO, drop: frozenset = PNG_STRIP_CHUNKS,
+                     transform: Optional[Callable[[bytes, bytes], Optional[bytes]]] = None) -> int:
+    """Copy a PNG chunk by chunk, dropping the given chunk types; returns bytes removed
+    
+    With a transform, chunks of those types are passed to transform(chunk_type, data)
+    instead, which returns the data to keep (CRC is recomputed) or None to drop the chunk.
+    """
+    if src.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("not a PNG file")
+    dst.write(PNG_SIGNATURE)
+    
+    removed = 0
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            raise ValueError("truncated PNG (no IEND chunk)")
+        length, chunk_type = struct.unpack('>I4s', header)
+        
+        if chunk_type in drop:
+            if transform is None:
+                src.seek(length + 4, os.SEEK_CUR)
+                removed += length + 12
+                continue
+            
+            data = src.read(length)
+            src.seek(4, os.SEEK_CUR)
+            new_data = transform(chunk_type, data)
+            if new_data is None:
+                removed += length + 12
+            else:
+                crc = zlib.crc32(chunk_type + new_data)
+                dst.write(struct.pack('>I4s', len(new_data), chunk_type) + new_data + struct.pack('>I', crc))
+                removed += length - len(new_data)
+            continue
+        
+        # Chunk data and CRC are copied untouched, IDAT is never decompressed
+        dst.write(header)
+        _copy_bytes(src, dst, length + 4)
+        if chunk_type == b'IEND':
+            return removed
+
+
+def strip_jpeg_segments(src: BinaryIO, dst: BinaryIO, drop: frozenset = JPEG_METADATA_MARKERS,
+                        transform: Optional[Callable[[int, bytes], Optional[bytes]]] = None) -> int:
+    """Copy a JPEG segment by segment, dropping the given markers; returns bytes removed
+    
+    With a transform, segments with those markers are passed to transform(marker, data)
+    instead, which returns the data to keep or None to drop the segment. Everything from
+    the first SOS marker on (the entropy-coded image data) is streamed through as is.
+    """
+    if src.read(2) != b'\xff\xd8':
+        raise ValueError("not a JPEG file")
+    dst.write(b'\xff\xd8')
+    
+    removed = 0
+    while True:
+        byte = src.read(1)
+        if byte != b'\xff':
+            raise ValueError("corrupt JPEG marker stream")
+        marker = src.read(1)
+        while marker == b'\xff':  # Fill bytes
+            marker = src.read(1)
+        if not marker:
+            raise ValueError("truncated JPEG")
+        
+        if marker[0] in JPEG_STANDALONE_MARKERS:
+            dst.write(b'\xff' + marker)
+            continue
+        if marker[0] in (JPEG_SOS, JPEG_EOI):
+            dst.write(b'\xff' + marker)
+            _copy_rest(src, dst)
+            return removed
+        
+        length_bytes = src.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("truncated JPEG")
+        length = struct.unpack('>H', length_bytes)[0]
+        
+        if marker[0] in drop:
+            new_data = None
+            if transform is not None:
+                new_data = transform(marker[0], src.read(length - 2))
+            else:
+                src.seek(length - 2, os.SEEK_CUR)
+            if new_data is None:
+                removed += length + 2
+            else:
+                if len(new_data) > 0xFFFD:
+                    raise ValueError("JPEG segment too large")
+                dst.write(b'\xff' + marker + struct.pack('>H', len(new_data) + 2) + new_data)
+                removed += length - 2 - len(new_data)
+        else:
+            dst.write(b'\xff' + marker + length_bytes)
+            _copy_bytes(src, dst, length - 2)
+
+
+# Lossless strippers by container format
+CONTAINER_STRIPPERS = {
+    'png': strip_png_chunks,
+    'jpeg': strip_jpeg_segments,
+}
+
+
+# Anything the readers accept: a path, a bytes-like buffer or a binary file object
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# Display name used for data read from standard input ('-' on the command line)
+STDIN_NAME = '<stdin>'
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object (bytes, bytearray, memoryview, mmap)
+    
+    Unlike io.BytesIO it never copies the whole buffer: each read() copies just the
+    requested slice, so seeking past image data costs nothing.
+    """
+    
+    def __init__(self, buffer: Any, name: str = '<memory>'):
+        super().__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+        self.name = name
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def read_view(self, size: int = -1) -> memoryview:
+        """Like read(), but return a zero-copy slice of the buffer"""
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        view = self._view[self._pos:end]
+        self._pos = max(self._pos, end)
+        return view
+    
+    def read(self, size: int = -1) -> bytes:
+        return self.read_view(size).tobytes()
+    
+    def readinto(self, b) -> int:
+        view = self.read_view(len(b))
+        b[:len(view)] = view
+        return len(view)
+    
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(offset, 0)
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def getbuffer(self) -> memoryview:
+        return self._view
+    
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+# Files at least this large are memory-mapped for reading; smaller ones are cheaper to read()
+MMAP_MIN_BYTES = 1024 * 1024
+# Leading bytes of a mapped file read ahead for metadata (JPEG APP segments, PNG header chunks)
+READ_AHEAD_BYTES = 256 * 1024
+# TIFF metadata ranges closer than this are read ahead as one window
+READ_AHEAD_GAP = 64 * 1024
+
+
+class MappedReader(BufferReader):
+    """BufferReader over a read-only memory map of a file, which it unmaps on close"""
+    
+    def __init__(self, buf: mmap.mmap, name: str):
+        super().__init__(buf, name)
+        self._map = buf
+    
+    def read_view(self, size: int = -1) -> memoryview:
+        view = super().read_view(size)
+        if STATS is not None:
+            STATS.count('bytes_read', len(view))
+        return view
+    
+    def close(self):
+        super().close()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # A slice is still referenced; the map goes away when it is collected
+
+
+def metadata_windows(buf: Any) -> List[Tuple[int, int]]:
+    """(start, end) ranges of a mapped image worth reading ahead to parse its metadata"""
+    windows = [(0, min(READ_AHEAD_BYTES, len(buf)))]
+    if sniff_image_format(bytes(buf[:8])) != 'tiff':
+        return windows
+    try:
+        ranges = sorted(tiff_metadata_ranges(buf))
+    except (struct.error, ValueError):
+        return windows  # exifread reports the damage
+    for start, end in ranges:
+        if start <= windows[-1][1] + READ_AHEAD_GAP:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def advise_reads(buf: mmap.mmap, sequential: bool = False):
+    """Tell the kernel which parts of a mapped file will be read
+    
+    Metadata reads fetch only the metadata windows, so image strips of a large TIFF
+    on a network mount are never pulled in; sequential reads get full read-ahead.
+    """
+    if not hasattr(buf, 'madvise'):
+        return  # Windows, Python < 3.8
+    try:
+        if sequential:
+            buf.madvise(mmap.MADV_SEQUENTIAL)
+            return
+        buf.madvise(mmap.MADV_RANDOM)
+        for start, end in metadata_windows(buf):
+            start -= start % mmap.PAGESIZE
+            buf.madvise(mmap.MADV_WILLNEED, start, min(end, len(buf)) - start)
+    except (AttributeError, OSError, ValueError):
+        pass  # Advice only; a missing MADV_* constant or a refused hint changes nothing
+
+
+def map_file(f: BinaryIO, sequential: bool = False) -> Optional[mmap.mmap]:
+    """Map an open file read-only, or None for small files and anything that can't be mapped
+    
+    Pipes, sockets, devices, empty and small files are left to ordinary buffered reads.
+    Like any mapping, truncating the file while it is mapped faults the reader (SIGBUS).
+    """
+    try:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    advise_reads(buf, sequential)
+    return buf
+
+
+def source_name(source: ImageSource) -> str:
+    """Printable name for an image source"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, 'name', None) or f"<{type(source).__name__}>"
+
+
+@contextlib.contextmanager
+def open_source(source: ImageSource, sequential: bool = False, mapped: bool = True) -> Iterator[BinaryIO]:
+    """Yield a seekable binary file for source; only files opened here are closed
+    
+    Large files are memory-mapped unless mapped=False, so seeks are free and reads copy
+    straight from the page cache; sequential=True is for callers that will read the
+    whole file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        # Count disk reads only when stats are being collected
+        with (open(source, 'rb') if STATS is None else io.BufferedReader(_CountingFileIO(source))) as f:
+            buf = map_file(f, sequential) if mapped else None
+            if buf is None:
+                yield f if f.seekable() else BufferReader(f.read(), os.fspath(source))  # e.g. a named pipe
+                return
+            reader = MappedReader(buf, os.fspath(source))
+            # Parsers make many tiny reads, which a C buffer answers faster than Python can;
+            # sequential readers take slices of the map directly
+            with (reader if sequential else io.BufferedReader(reader)) as mapped:
+                yield mapped
+    elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        reader = BufferReader(source)
+        try:
+            yield reader
+        finally:
+            reader.close()
+    elif hasattr(source, 'read'):
+        if getattr(source, 'seekable', lambda: False)():
+            yield source
+        else:
+            yield BufferReader(source.read(), source_name(source))  # Pipes and sockets can't seek
+    else:
+        raise TypeError(f"unsupported image source: {type(source).__name__}")
+
+
+def parse_json_value(text: str) -> Optional[Any]:
+    """Parse text as a JSON object/array, or return None
+    
+    Only text whose first and last non-blank characters delimit an object or array is
+    handed to json.loads, so ordinary prompt text is rejected without a parse attempt.
+    """
+    if not isinstance(text, str):
+        return None
+    stripped = text.strip()
+    if len(stripped) < 2 or (stripped[0], stripped[-1]) not in (('{', '}'), ('[', ']')):
+        return None
+    
+    import json
+    try:
+        with timed('json'):
+            return json.loads(stripped)
+    except ValueError:
+        return None
+
+
+def is_comfyui_graph(data: Any) -> bool:
+    """Check for a ComfyUI UI workflow ('nodes') or API prompt ('class_type' per node)"""
+    return isinstance(data, dict) and (
+        'nodes' in data or any(isinstance(v, dict) and 'class_type' in v for v in data.values()))
+
+
+class ParsedMetadata(dict):
+    """AI metadata dict whose values are stringified and JSON-parsed lazily, at most once each"""
+    
+    _NOT_JSON = object()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._text = {}
+        self._json = {}
+    
+    @classmethod
+    def wrap(cls, ai_metadata: Dict[str, Any]) -> 'ParsedMetadata':
+        """Reuse an existing ParsedMetadata (and its parse cache) or wrap a plain dict"""
+        return ai_metadata if isinstance(ai_metadata, cls) else cls(ai_metadata)
+    
+    def text(self, tag: Any) -> str:
+        if tag not in self._text:
+            self._text[tag] = str(self[tag])
+        return self._text[tag]
+    
+    def json(self, tag: Any) -> Optional[Any]:
+        """Parsed JSON object/array for tag, or None"""
+        if tag not in self._json:
+            parsed = parse_json_value(self.text(tag))
+            self._json[tag] = self._NOT_JSON if parsed is None else parsed
+        parsed = self._json[tag]
+        return None if parsed is self._NOT_JSON else parsed
+    
+    def has_json(self) -> bool:
+        return any(self.json(tag) is not None for tag in self)
+    
+    def comfyui_workflow(self) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """(tag, graph) for the first workflow/comfy tag holding a ComfyUI graph"""
+        for tag in self:
+            tag_lower = str(tag).lower()
+            if 'workflow' in tag_lower or 'comfy' in tag_lower:
+                parsed = self.json(tag)
+                if is_comfyui_graph(parsed):
+                    return tag, parsed
+        return None
+
+
+def format_generator(generator: Dict[str, Any]) -> str:
+    """One-line summary of an identify_generators() entry"""
+    fields = ('model', 'seed', 'steps', 'cfg_scale', 'sampler', 'claim_generator')
+    details = [f"{field}={generator[field]}" for field in fields if field in generator]
+    line = f"🎨 Generator: {generator['generator']}"
+    return f"{line} ({', '.join(details)})" if details else line
+
+
+def metadata_key(tag: Any) -> str:
+    """Bare key of a metadata tag: 'PNG.parameters' -> 'parameters', 'EXIF UserComment' -> 'UserComment'"""
+    if isinstance(tag, int):
+        return exif_tag_tables()[0].get(tag, str(tag))
+    if tag.startswith('PNG.'):
+        return tag[4:]
+    return tag.rpartition(' ')[2]
+
+
+# UserComment character code prefixes (EXIF 2.3, 4.6.5)
+USER_COMMENT_CODECS = {b'ASCII\0\0\0': 'ascii', b'UNICODE\0': 'utf-16-be', b'JIS\0\0\0\0\0': 'shift_jis',
+                       b'\0' * 8: 'utf-8'}
+
+
+def metadata_text(value: Any) -> str:
+    """Text of a metadata value, decoding UserComment-style byte strings"""
+    if isinstance(value, bytes):
+        codec = USER_COMMENT_CODECS.get(value[:8])
+        body = value[8:]
+        if codec == 'utf-16-be' and body[1:2] == b'\0' and body[:1] != b'\0':
+            codec = 'utf-16-le'  # Follows the TIFF byte order, which is lost by now
+        if codec:
+            return body.decode(codec, 'replace').rstrip('\0')
+        return value.decode('utf-8', 'replace').rstrip('\0')
+    return str(value)
+
+
+class GeneratorDetector(abc.ABC):
+    """A generator's metadata format, registered with @register_detector
+    
+    keys are bare PNG text keywords or EXIF tag names (see metadata_key); readers only
+    need to extract and decode those. claims() must be cheap, since it runs on every
+    scan; parse() returns the structured fields (prompt, negative_prompt, seed, steps,
+    cfg_scale, sampler, scheduler, model, ...) and only runs when they are asked for.
+    Both receive {key: value} for the declared keys present in the file; a subclass
+    missing either one fails at registration, not on the first matching file.
+    """
+    
+    name = ''
+    keys = frozenset()
+    
+    @abc.abstractmethod
+    def claims(self, values: Dict[str, Any]) -> bool:
+        """Whether these values are this generator's format"""
+    
+    @abc.abstractmethod
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Structured fields from values that claims() accepted"""
+    
+    @staticmethod
+    def json_value(values: Dict[str, Any], key: str) -> Optional[Any]:
+        return parse_json_value(metadata_text(values[key])) if key in values else None
+    
+    @staticmethod
+    def looks_like_json(values: Dict[str, Any], key: str) -> bool:
+        return key in values and metadata_text(values[key]).lstrip()[:1] in ('{', '[')
+
+
+# Registered detectors, in dispatch order, and the union of the keys they read
+DETECTORS: List[GeneratorDetector] = []
+DETECTOR_KEYS: Set[str] = set()
+
+
+def register_detector(cls):
+    """Class decorator adding a GeneratorDetector subclass to the registry"""
+    DETECTORS.append(cls())
+    DETECTOR_KEYS.update(cls.keys)
+    return cls
+
+
+# (detector, {key: value} it was given, original tags it claimed)
+GeneratorMatch = Tuple[GeneratorDetector, Dict[str, Any], List[Any]]
+
+
+def detect_generators(metadata: Dict[Any, Any]) -> List[GeneratorMatch]:
+    """Run the detectors whose keys occur in metadata; only those keys are looked at"""
+    by_key = {}
+    for tag in metadata:
+        key = metadata_key(tag)
+        if key in DETECTOR_KEYS:
+            by_key.setdefault(key, []).append(tag)
+    if not by_key:
+        return []
+    
+    matches = []
+    for detector in DETECTORS:
+        present = [key for key in detector.keys if key in by_key]
+        if not present:
+            continue
+        values = {key: metadata[by_key[key][0]] for key in present}
+        if detector.claims(values):
+            matches.append((detector, values, [tag for key in present for tag in by_key[key]]))
+    return matches
+
+
+def _number(value: Any) -> Any:
+    """int or float for numeric strings, otherwise value unchanged"""
+    if isinstance(value, str):
+        for convert in (int, float):
+            try:
+                return convert(value.strip())
+            except ValueError:
+                pass
+    return value
+
+
+def _drop_empty(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in fields.items() if value not in (None, '', [], {})}
+
+
+@register_detector
+class SwarmUIDetector(GeneratorDetector):
+    """SwarmUI / StableSwarmUI: JSON with a 'sui_image_params' object"""
+    
+    name = 'SwarmUI'
+    keys = frozenset({'parameters', 'sui_image_params', 'UserComment'})
+    
+    def _params(self, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        for key in ('sui_image_params', 'parameters', 'UserComment'):
+            data = self.json_value(values, key)
+            if isinstance(data, dict):
+                params = data.get('sui_image_params', data if key == 'sui_image_params' else None)
+                if isinstance(params, dict):
+                    return params
+        return None
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        return 'sui_image_params' in values or any(
+            self.looks_like_json(values, key) and 'sui_image_params' in metadata_text(values[key])
+            for key in ('parameters', 'UserComment'))
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        params = self._params(values) or {}
+        return _drop_empty({
+            'prompt': params.get('prompt'),
+            'negative_prompt': params.get('negativeprompt'),
+            'seed': params.get('seed'),
+            'steps': params.get('steps'),
+            'cfg_scale': params.get('cfgscale'),
+            'sampler': params.get('sampler'),
+            'scheduler': params.get('scheduler'),
+            'model': params.get('model'),
+            'size': f"{params['width']}x{params['height']}" if 'width' in params and 'height' in params else None,
+        })
+
+
+@register_detector
+class A1111Detector(GeneratorDetector):
+    """AUTOMATIC1111 / Forge / Fooocus-style 'parameters' text ending in a 'Steps: ...' line"""
+    
+    name = 'A1111'
+    keys = frozenset({'parameters', 'UserComment'})
+    # Settings are 'Key: value' pairs separated by commas; values may be quoted
+    SETTING_PATTERN = re.compile(r'\s*([\w ./-]+):\s*("(?:\\.|[^\\"])+"|[^,]*)(?:,|$)')
+    FIELDS = {'Steps': 'steps', 'Sampler': 'sampler', 'Schedule type': 'scheduler', 'CFG scale': 'cfg_scale',
+              'Seed': 'seed', 'Size': 'size', 'Model': 'model', 'Model hash': 'model_hash'}
+    
+    @staticmethod
+    def _text(values: Dict[str, Any]) -> Optional[str]:
+        for key in ('parameters', 'UserComment'):
+            if key in values:
+                text = metadata_text(values[key]).strip()
+                if text.startswith('Steps: ') or '\nSteps: ' in text:
+                    return text
+        return None
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        return self._text(values) is not None
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        text = self._text(values) or ''
+        split = text.rfind('\nSteps: ')
+        body, settings_line = (text[:split], text[split + 1:]) if split >= 0 else ('', text)
+        
+        prompt, _, negative = body.partition('Negative prompt: ')
+        settings = {key.strip(): value.strip('"') for key, value in self.SETTING_PATTERN.findall(settings_line)}
+        fields = {'prompt': prompt.strip(), 'negative_prompt': negative.strip()}
+        for key, field in self.FIELDS.items():
+            if key in settings:
+                fields[field] = _number(settings[key])
+        fields['settings'] = settings
+        return _drop_empty(fields)
+
+
+@register_detector
+class ComfyUIDetector(GeneratorDetector):
+    """ComfyUI: API-format 'prompt' graph and/or UI 'workflow' graph as JSON"""
+    
+    name = 'ComfyUI'
+    keys = frozenset({'prompt', 'workflow'})
+    SAMPLER_TYPES = ('KSampler', 'SamplerCustom')
+    MODEL_INPUTS = ('ckpt_name', 'unet_name', 'model_name')
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        return self.looks_like_json(values, 'prompt') or self.looks_like_json(values, 'workflow')
+    
+    @staticmethod
+    def _text_input(graph: Dict[str, Any], link: Any) -> Optional[str]:
+        """Follow a [node_id, output] link to the text of a prompt-encoding node"""
+        if not (isinstance(link, list) and link):
+            return None
+        node = graph.get(str(link[0]))
+        text = node.get('inputs', {}).get('text') if isinstance(node, dict) else None
+        return text if isinstance(text, str) else None
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {}
+        graph = self.json_value(values, 'prompt')
+        if isinstance(graph, dict):
+            nodes = [node for node in graph.values() if isinstance(node, dict)]
+            sampler_found = False
+            for node in nodes:
+                inputs = node.get('inputs') or {}
+                class_type = str(node.get('class_type', ''))
+                if 'model' not in fields:
+                    model = next((inputs[name] for name in self.MODEL_INPUTS if isinstance(inputs.get(name), str)), None)
+                    if model:
+                        fields['model'] = model
+                if class_type.startswith(self.SAMPLER_TYPES) and not sampler_found:
+                    sampler_found = True  # The first sampler describes the main pass
+                    fields.update(_drop_empty({
+                        'seed': inputs.get('seed', inputs.get('noise_seed')),
+                        'steps': inputs.get('steps'),
+                        'cfg_scale': inputs.get('cfg'),
+                        'sampler': inputs.get('sampler_name'),
+                        'scheduler': inputs.get('scheduler'),
+                        'prompt': self._text_input(graph, inputs.get('positive')),
+                        'negative_prompt': self._text_input(graph, inputs.get('negative')),
+                    }))
+            fields['node_count'] = len(nodes)
+        workflow = self.json_value(values, 'workflow')
+        if isinstance(workflow, dict) and isinstance(workflow.get('nodes'), list):
+            fields['workflow_nodes'] = len(workflow['nodes'])
+        return _drop_empty(fields)
+
+
+@register_detector
+class InvokeAIDetector(GeneratorDetector):
+    """InvokeAI: 'invokeai_metadata' JSON (3.x+), legacy 'sd-metadata' JSON and 'Dream' command lines"""
+    
+    name = 'InvokeAI'
+    keys = frozenset({'invokeai_metadata', 'invokeai_graph', 'sd-metadata', 'Dream'})
+    DREAM_OPTIONS = {'-S': 'seed', '-s': 'steps', '-C': 'cfg_scale', '-A': 'sampler'}
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        return True  # These keys are only written by InvokeAI
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        data = self.json_value(values, 'invokeai_metadata')
+        if isinstance(data, dict):
+            model = data.get('model')
+            return _drop_empty({
+                'prompt': data.get('positive_prompt'),
+                'negative_prompt': data.get('negative_prompt'),
+                'seed': data.get('seed'),
+                'steps': data.get('steps'),
+                'cfg_scale': data.get('cfg_scale'),
+                'scheduler': data.get('scheduler'),
+                'model': model.get('name', model.get('model_name')) if isinstance(model, dict) else model,
+                'size': f"{data['width']}x{data['height']}" if 'width' in data and 'height' in data else None,
+            })
+        
+        data = self.json_value(values, 'sd-metadata')
+        if isinstance(data, dict):
+            image = data.get('image') or {}
+            prompt = image.get('prompt')
+            if isinstance(prompt, list):
+                prompt = ' '.join(p.get('prompt', '') for p in prompt if isinstance(p, dict))
+            return _drop_empty({
+                'prompt': prompt,
+                'seed': image.get('seed'),
+                'steps': image.get('steps'),
+                'cfg_scale': image.get('cfg_scale'),
+                'sampler': image.get('sampler'),
+                'model': data.get('model_weights'),
+            })
+        
+        if 'Dream' in values:
+            text = metadata_text(values['Dream'])
+            prompt, _, options = text.partition('" -')
+            fields = {'prompt': prompt.strip().strip('"')}
+            tokens = ('-' + options).split() if options else []
+            for option, value in zip(tokens, tokens[1:]):
+                if option in self.DREAM_OPTIONS:
+                    fields[self.DREAM_OPTIONS[option]] = _number(value)
+            return _drop_empty(fields)
+        return {}
+
+
+@register_detector
+class NovelAIDetector(GeneratorDetector):
+    """NovelAI: Software 'NovelAI' with generation settings as JSON in 'Comment'"""
+    
+    name = 'NovelAI'
+    keys = frozenset({'Comment', 'Software', 'Source', 'Description'})
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        if metadata_text(values.get('Software', '')).startswith('NovelAI'):
+            return True
+        comment = metadata_text(values.get('Comment', ''))
+        return comment.lstrip().startswith('{') and '"uc"' in comment
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        comment = self.json_value(values, 'Comment')
+        comment = comment if isinstance(comment, dict) else {}
+        return _drop_empty({
+            'prompt': comment.get('prompt') or metadata_text(values.get('Description', '')),
+            'negative_prompt': comment.get('uc'),
+            'seed': comment.get('seed'),
+            'steps': comment.get('steps'),
+            'cfg_scale': comment.get('scale'),
+            'sampler': comment.get('sampler'),
+            'model': metadata_text(values['Source']) if 'Source' in values else None,
+            'size': f"{comment['width']}x{comment['height']}" if 'width' in comment and 'height' in comment else None,
+        })
+
+
+C2PA_KEY = 'C2PA'
+C2PA_SOURCE_TYPE = re.compile(rb'digitalsourcetype/(\w+)', re.IGNORECASE)
+# IPTC digital source types meaning the content was made by a generative model
+C2PA_AI_SOURCE_TYPES = frozenset({'trainedAlgorithmicMedia', 'compositeWithTrainedAlgorithmicMedia',
+                                  'algorithmicMedia'})
+
+
+def _cbor_text_after(data: bytes, key: bytes) -> Optional[str]:
+    """The CBOR text string following the first occurrence of key that is followed by one"""
+    start = data.find(key)
+    while start >= 0:
+        i = start + len(key)
+        head = data[i] if i < len(data) else 0
+        if 0x60 <= head <= 0x77:
+            length, i = head - 0x60, i + 1
+        elif head == 0x78 and i + 1 < len(data):
+            length, i = data[i + 1], i + 2
+        elif head == 0x79 and i + 2 < len(data):
+            length, i = struct.unpack_from('>H', data, i + 1)[0], i + 3
+        else:
+            start = data.find(key, i)
+            continue
+        return data[i:i + length].decode('utf-8', 'replace')
+    return None
+
+
+def summarize_c2pa(data: bytes) -> Optional[str]:
+    """'claim_generator=...; digital_source_type=...' for a C2PA manifest store, or None"""
+    if b'c2pa' not in data:
+        return None
+    fields = []
+    generator = _cbor_text_after(data, b'claim_generator')
+    if generator:
+        fields.append(f"claim_generator={generator}")
+    source_type = C2PA_SOURCE_TYPE.search(data)
+    if source_type:
+        fields.append(f"digital_source_type={source_type.group(1).decode('ascii')}")
+    return '; '.join(fields) or 'manifest present'
+
+
+@register_detector
+class C2PADetector(GeneratorDetector):
+    """C2PA Content Credentials whose digital source type declares generative AI"""
+    
+    name = 'C2PA'
+    keys = frozenset({C2PA_KEY})
+    
+    def parse(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        summary = metadata_text(values[C2PA_KEY])
+        return dict(field.split('=', 1) for field in summary.split('; ') if '=' in field)
+    
+    def claims(self, values: Dict[str, Any]) -> bool:
+        return self.parse(values).get('digital_source_type') in C2PA_AI_SOURCE_TYPES
+
+
+# Linux ioctl to share a file's extents with another file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def reflink_copy(src: str, dst: str) -> bool:
+    """Create dst as a copy-on-write clone of src; returns False if unsupported"""
+    try:
+        import fcntl
+    except ImportError:
+        return False  # Not available on Windows
+    
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        import shutil
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+
+
+class RunStats:
+    """Per-stage wall time histograms and counters collected for --profile / --stats
+    
+    Stage timings are inclusive: a stage nested in another (e.g. exifread inside
+    png_chunks for an eXIf chunk) also counts towards its parent.
+    """
+    
+    HISTOGRAM_BOUNDS = (0.0001, 0.001, 0.01, 0.1, 1.0)  # Seconds; one extra bucket above
+    HISTOGRAM_LABELS = ('<0.1ms', '<1ms', '<10ms', '<100ms', '<1s', '>=1s')
+    
+    def __init__(self, slowest: int = 10):
+        self.slowest_n = slowest
+        self.stages = {}  # name -> [calls, total seconds, max seconds, bucket counts...]
+        self.counters = collections.Counter()
+        self.formats = collections.Counter()
+        self.verdicts = collections.Counter()
+        self.slowest = []  # Min-heap of (seconds, path)
+        self._lock = threading.Lock()
+    
+    def add_time(self, stage: str, seconds: float):
+        bucket = 3
+        for bound in self.HISTOGRAM_BOUNDS:
+            if seconds < bound:
+                break
+            bucket += 1
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0, 0.0, 0.0] + [0] * len(self.HISTOGRAM_LABELS)
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[bucket] += 1
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+    
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+    
+    def count_format(self, image_format: str):
+        with self._lock:
+            self.formats[image_format] += 1
+    
+    def record_file(self, path: str, seconds: float, verdict: str):
+        self.add_time('file', seconds)
+        with self._lock:
+            self.verdicts[verdict] += 1
+            if len(self.slowest) < self.slowest_n:
+                heapq.heappush(self.slowest, (seconds, path))
+            elif self.slowest and seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, path))
+    
+    def count_verdict(self, verdict: str):
+        """Count a file that produced no record ('error', 'skipped')"""
+        with self._lock:
+            self.verdicts[verdict] += 1
+    
+    def drain(self) -> Dict[str, Any]:
+        """Return everything collected so far as plain data and start over"""
+        with self._lock:
+            data = {
+                'stages': self.stages,
+                'counters': dict(self.counters),
+                'formats': dict(self.formats),
+                'verdicts': dict(self.verdicts),
+                'slowest': self.slowest,
+            }
+            self.stages = {}
+            self.counters = collections.Counter()
+            self.formats = collections.Counter()
+            self.verdicts = collections.Counter()
+            self.slowest = []
+        return data
+    
+    def merge(self, data: Dict[str, Any]):
+        """Fold in the drained stats of a worker process"""
+        with self._lock:
+            for name, other in data['stages'].items():
+                entry = self.stages.get(name)
+                if entry is None:
+                    self.stages[name] = list(other)
+                    continue
+                entry[0] += other[0]
+                entry[1] += other[1]
+                entry[2] = max(entry[2], other[2])
+                for i in range(3, len(entry)):
+                    entry[i] += other[i]
+            self.counters.update(data['counters'])
+            self.formats.update(data['formats'])
+            self.verdicts.update(data['verdicts'])
+            self.slowest = heapq.nlargest(self.slowest_n, self.slowest + data['slowest'])
+            heapq.heapify(self.slowest)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Machine-readable summary, as written by --stats FILE"""
+        return {
+            'stages': {
+                name: {
+                    'calls': entry[0],
+                    'total_seconds': entry[1],
+                    'max_seconds': entry[2],
+                    'histogram': dict(zip(self.HISTOGRAM_LABELS, entry[3:])),
+                }
+                for name, entry in sorted(self.stages.items())
+            },
+            'counters': dict(self.counters),
+            'formats': dict(self.formats),
+            'verdicts': dict(self.verdicts),
+            'slowest_files': [{'path': path, 'seconds': seconds}
+                              for seconds, path in sorted(self.slowest, reverse=True)],
+        }
+    
+    def print_summary(self, file=None):
+        """Print the per-stage table, counters and slowest files"""
+        def out(line=""):
+            print(line, file=file)
+        
+        out("\n⏱️ STAGE TIMINGS:")
+        header = f"{'stage':<14} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}  " + \
+                 " ".join(f"{label:>7}" for label in self.HISTOGRAM_LABELS)
+        out(header)
+        out("-" * len(header))
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            calls, total, longest = entry[:3]
+            out(f"{name:<14} {calls:>7} {total:>9.3f} {total / calls * 1000:>9.2f} {longest * 1000:>9.2f}  " +
+                " ".join(f"{n:>7}" for n in entry[3:]))
+        
+        out(f"\nBytes read: {self.counters['bytes_read']:,}  written: {self.counters['bytes_written']:,}")
+        if self.formats:
+            out("Formats: " + ", ".join(f"{k}={v}" for k, v in sorted(self.formats.items())))
+        if self.verdicts:
+            out("Verdicts: " + ", ".join(f"{k}={v}" for k, v in sorted(self.verdicts.items())))
+        other = {k: v for k, v in self.counters.items() if not k.startswith('bytes_')}
+        if other:
+            out("Counters: " + ", ".join(f"{k}={v}" for k, v in sorted(other.items())))
+        if self.slowest:
+            out(f"\nSlowest {len(self.slowest)} file(s):")
+            for seconds, path in sorted(self.slowest, reverse=True):
+                out(f"  {seconds * 1000:9.2f} ms  {path}")
+
+
+# Collector for the current run; None unless --profile or --stats is given
+STATS: Optional[RunStats] = None
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def timed(stage: str):
+    """Context manager timing a stage into STATS; a shared no-op when stats are off"""
+    return _NOT_TIMED if STATS is None else STATS.stage(stage)
+
+
+def timed_iter(iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+    """Wrap a lazy iterable so the time spent producing each item counts towards stage"""
+    iterator = iter(iterable)
+    if STATS is None:
+        return iterator
+    
+    def generate():
+        while True:
+            with timed(stage):
+                item = next(iterator, _NOT_TIMED)
+            if item is _NOT_TIMED:
+                return
+            yield item
+    return generate()
+
+
+class _CountingFileIO(io.FileIO):
+    """Unbuffered file that adds the bytes it reads to STATS"""
+    
+    def readinto(self, b) -> Optional[int]:
+        n = super().readinto(b)
+        if n and STATS is not None:
+            STATS.count('bytes_read', n)
+        return n
+
+
+# Serializes changes to Pillow's global Image.MAX_IMAGE_PIXELS
+_PILLOW_LIMIT_LOCK = threading.Lock()
+
+
+class _NothingRemoved(Exception):
+    """Abandons a rewrite that turned out not to change anything"""
+
+
+def count_written(path: str):
+    """Add the size of a file just written to STATS"""
+    if STATS is not None:
+        STATS.count('bytes_written', os.path.getsize(path))
+
+
+class ExifMetadataProcessor:
+    """Process EXIF metadata for images"""
+    
+    # Common AI/generation related tags to look for
+    AI_GENERATION_TAGS = [
+        'Software',
+        'ImageDescription', 
+        'UserComment',
+        'Artist',
+        'Copyright',
+        'ProcessingSoftware',
+        'OriginalRawFileName',
+        'DocumentName',
+        # PNG-specific text chunks commonly used by AI tools
+        'parameters',
+        'prompt',
+        'negative_prompt', 
+        'workflow',
+        'Comment',
+        'Description',
+        'Title',
+        'Author',
+        'Software',
+        'Creation Time',
+        'Source'
+    ]
+    
+    # Keywords that might indicate AI generation
+    AI_KEYWORDS = [
+        'stable diffusion',
+        'midjourney', 
+        'dall-e',
+        'dalle',
+        'ai generated',
+        'artificial intelligence',
+        'neural network',
+        'gan',
+        'diffusion',
+        'automatic1111',
+        'invokeai',
+        'comfyui',
+	'prompt',
+        'novelai',
+        'swarmui',
+        'stableswarmui',
+        'stable swarm ui'
+    ]
+    
+    # Precompiled matchers built once from the lists above
+    AI_TAG_SET = frozenset(AI_GENERATION_TAGS)
+    SOFTWARE_TAGS = frozenset({'Software', 'ProcessingSoftware'})
+    # One alternation over all keywords (longest first), matched on whole words so
+    # that e.g. 'gan' does not fire inside 'organ'
+    AI_KEYWORD_PATTERN = re.compile(
+        r'(?<![a-z])(?:'
+        + '|'.join(re.escape(keyword) for keyword in sorted(AI_KEYWORDS, key=len, reverse=True))
+        + r')(?![a-z])'
+    )
+    # Directory listings kept by get_unique_filename
+    MAX_LISTED_DIRS = 64
+
+    def __init__(self, backup: bool = True, backup_dir: Optional[str] = None,
+                 max_metadata_bytes: int = DEFAULT_MAX_METADATA_MB << 20,
+                 max_chunk_bytes: int = DEFAULT_MAX_CHUNK_MB << 20,
+                 max_pixels: int = DEFAULT_MAX_PIXELS, use_mmap: bool = True):
+        self.supported_formats = {'.jpg', '.jpeg', '.tiff', '.tif', '.png'}
+        self.backup = backup
+        self.backup_dir = backup_dir
+        # Per-file memory limits (0 = unlimited), so many workers stay within a known footprint
+        self.max_metadata_bytes = max_metadata_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_pixels = max_pixels
+        # Long-lived processes turn mapping off: a file truncated while mapped kills the process (SIGBUS)
+        self.use_mmap = use_mmap
+        # Directory listings for get_unique_filename: directory -> (names, next suffix per name), LRU
+        self._dir_names = collections.OrderedDict()
+        self._names_lock = threading.Lock()
+    
+    def get_unique_filename(self, base_path: str) -> str:
+        """Generate a unique filename by adding _1, _2, etc. if file exists
+        
+        Each directory is listed once and the names handed out are remembered, so no
+        existence probes are needed even with thousands of sidecars in one directory.
+        Only the MAX_LISTED_DIRS most recently used listings are kept; an evicted
+        directory is listed again if it comes back.
+        """
+        # Split the path into directory, filename, and extension
+        directory = os.path.dirname(base_path)
+        filename = os.path.basename(base_path)
+        name, ext = os.path.splitext(filename)
+        
+        with self._names_lock:
+            listing = self._dir_names.get(directory)
+            if listing is None:
+                try:
+                    with os.scandir(directory or os.curdir) as it:
+                        listing = ({entry.name for entry in it}, {})
+                except OSError:
+                    listing = (set(), {})
+                self._dir_names[directory] = listing
+                while len(self._dir_names) > self.MAX_LISTED_DIRS:
+                    self._dir_names.popitem(last=False)
+            else:
+                self._dir_names.move_to_end(directory)
+            taken, next_suffix = listing
+            
+            if filename in taken:
+                counter = next_suffix.get(filename, 1)
+                while f"{name}_{counter}{ext}" in taken:
+                    counter += 1
+                next_suffix[filename] = counter + 1
+                filename = f"{name}_{counter}{ext}"
+            taken.add(filename)
+        return os.path.join(directory, filename)
+    
+    def _create_unique_file(self, base_path: str):
+        """Open a new text file at get_unique_filename(base_path) without ever overwriting one"""
+        while True:
+            path = self.get_unique_filename(base_path)
+            try:
+                return path, open(path, 'x', encoding='utf-8')
+            except FileExistsError:
+                continue  # Created after the directory was listed; the name is now marked taken
+    
+    @property
+    def detection_keys(self) -> Set[str]:
+        """Metadata keys worth decoding when only AI metadata is wanted"""
+        return self.AI_TAG_SET | DETECTOR_KEYS
+    
+    def is_json_format(self, text: str) -> bool:
+        """Check if text is a JSON object or array"""
+        return parse_json_value(text) is not None
+    
+    def copy_to_clipboard(self, text: str) -> bool:
+        """Copy text to clipboard using cross-platform method"""
+        try:
+            # Try Windows first
+            import win32clipboard
+            win32clipboard.OpenClipboard()
+            win32clipboard.EmptyClipboard()
+            win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
+            win32clipboard.CloseClipboard()
+            return True
+        except ImportError:
+            try:
+                # Try pyperclip as fallback
+                import pyperclip
+                pyperclip.copy(text)
+                return True
+            except ImportError:
+                try:
+                    # Try using subprocess for cross-platform support
+                    import subprocess
+                    if sys.platform.startswith('win'):
+                        # Windows - use clip command
+                        process = subprocess.Popen(['clip'], stdin=subprocess.PIPE, text=True)
+                        process.communicate(input=text)
+                        return process.returncode == 0
+                    elif sys.platform.startswith('darwin'):
+                        # macOS - use pbcopy
+                        process = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE, text=True)
+                        process.communicate(input=text)
+                        return process.returncode == 0
+                    elif sys.platform.startswith('linux'):
+                        # Linux - try xclip or xsel
+                        try:
+                            process = subprocess.Popen(['xclip', '-selection', 'clipboard'], stdin=subprocess.PIPE, text=True)
+                            process.communicate(input=text)
+                            return process.returncode == 0
+                        except FileNotFoundError:
+                            try:
+                                process = subprocess.Popen(['xsel', '--clipboard', '--input'], stdin=subprocess.PIPE, text=True)
+                                process.communicate(input=text)
+                                return process.returncode == 0
+                            except FileNotFoundError:
+                                return False
+                except Exception:
+                    return False
+        except Exception:
+            return False
+        
+        return False
+    
+    def copy_ai_metadata_to_clipboard(self, ai_metadata: Dict[str, Any]) -> bool:
+        """Copy AI generation metadata to clipboard in appropriate format"""
+        if not ai_metadata:
+            print("No AI metadata found to copy")
+            return False
+        
+        try:
+            import json
+            parsed = ParsedMetadata.wrap(ai_metadata)
+            
+            # Check for ComfyUI workflow first
+            workflow = parsed.comfyui_workflow()
+            if workflow:
+                # Copy ComfyUI workflow as properly formatted JSON
+                _tag, comfyui_workflow = workflow
+                workflow_json = json.dumps(comfyui_workflow, indent=2, ensure_ascii=False)
+                if self.copy_to_clipboard(workflow_json):
+                    print("✓ ComfyUI workflow copied to clipboard")
+                    print("  Can be pasted directly into ComfyUI")
+                    return True
+                else:
+                    print("✗ Failed to copy to clipboard")
+                    return False
+            
+            # Check for other JSON content
+            for tag in parsed:
+                parsed_json = parsed.json(tag)
+                if parsed_json is not None:
+                    formatted_json = json.dumps(parsed_json, indent=2, ensure_ascii=False)
+                    if self.copy_to_clipboard(formatted_json):
+                        print(f"✓ JSON metadata from '{tag}' copied to clipboard")
+                        return True
+            
+            # If no JSON found, copy all metadata as formatted text
+            text_content = []
+            for tag in parsed:
+                text_content.append(f"{tag}: {parsed.text(tag)}")
+            
+            combined_text = "\n".join(text_content)
+            if self.copy_to_clipboard(combined_text):
+                print("✓ AI generation metadata copied to clipboard")
+                return True
+            else:
+                print("✗ Failed to copy to clipboard")
+                return False
+                
+        except Exception as e:
+            print(f"✗ Error copying metadata to clipboard: {e}")
+            return False
+    
+    def save_ai_metadata_to_file(self, image_filepath: str, ai_metadata: Dict[str, Any]) -> bool:
+        """Save AI generation metadata to separate file"""
+        if not ai_metadata:
+            print(f"No AI metadata found in {image_filepath} to save")
+            return False
+        
+        try:
+            import json
+            parsed = ParsedMetadata.wrap(ai_metadata)
+            
+            # Get base filename without extension
+            base_name = os.path.splitext(image_filepath)[0]
+            
+            # Look for ComfyUI workflow in metadata
+            workflow = parsed.comfyui_workflow()
+            
+            if workflow:
+                # Save as ComfyUI workflow JSON
+                tag, comfyui_workflow = workflow
+                print(f"🎨 Detected ComfyUI workflow in {tag}")
+                
+                json_filepath, f = self._create_unique_file(f"{base_name}.json")
+                with f:
+                    json.dump(comfyui_workflow, f, indent=2, ensure_ascii=False)
+                count_written(json_filepath)
+                
+                print(f"💾 Saved ComfyUI workflow: {json_filepath}")
+                print(f"   ✓ Can be loaded directly in ComfyUI")
+                
+            elif parsed.has_json():
+                # Save as general JSON file
+                json_content = {
+                    "source_file": os.path.basename(image_filepath),
+                    "metadata_tags": {str(tag): parsed.text(tag) for tag in parsed}
+                }
+                
+                json_filepath, f = self._create_unique_file(f"{base_name}.json")
+                with f:
+                    json.dump(json_content, f, indent=2, ensure_ascii=False)
+                count_written(json_filepath)
+                
+                print(f"💾 Saved AI metadata as JSON: {json_filepath}")
+                
+            else:
+                # Save as text file
+                txt_filepath, f = self._create_unique_file(f"{base_name}.txt")
+                with f:
+                    f.write(f"AI Generation Metadata for: {os.path.basename(image_filepath)}\n")
+                    f.write("=" * 50 + "\n\n")
+                    for tag in parsed:
+                        f.write(f"{tag}: {parsed.text(tag)}\n")
+                count_written(txt_filepath)
+                
+                print(f"💾 Saved AI metadata as text: {txt_filepath}")
+            
+            return True
+            
+        except Exception as e:
+            print(f"✗ Error saving metadata for {image_filepath}: {e}")
+            return False
+    
+    def detect_format(self, source: ImageSource) -> Optional[str]:
+        """Identify a path, buffer or file as 'png', 'jpeg' or 'tiff' by magic number"""
+        try:
+            with open_source(source, mapped=self.use_mmap) as f:
+                position = f.tell()
+                head = f.read(8)
+                f.seek(position)
+        except (OSError, TypeError):
+            return None
+        return sniff_image_format(head)
+    
+    def is_supported_format(self, filepath: ImageSource) -> bool:
+        """Check if file format is supported
+        
+        Paths with a known extension are accepted without opening them; anything else
+        (buffers, extensionless or misnamed files) is identified by its magic number.
+        """
+        if isinstance(filepath, (str, os.PathLike)) and os.path.splitext(filepath)[1].lower() in self.supported_formats:
+            return True
+        return self.detect_format(filepath) is not None
+    
+    def read_png_metadata(self, source: 'ImageSource', keys: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Read PNG text chunks and eXIf by walking the chunk list, without decoding pixels
+        
+        With keys, only text chunks with those keywords are decoded. Raises LimitExceeded
+        when the chunks, raw or decompressed, go over the limits.
+        """
+        exif_data = {}
+        text_data = {}
+        decoded_bytes = 0
+        wanted = PNG_METADATA_CHUNKS
+        if keys is None or C2PA_KEY in keys:
+            wanted = wanted | {PNG_C2PA_CHUNK}
+        
+        with open_source(source, mapped=self.use_mmap) as f, timed('png_chunks'):
+            for chunk_type, data in iter_png_chunks(f, wanted, max_bytes=self.max_metadata_bytes):
+                if chunk_type == PNG_C2PA_CHUNK:
+                    summary = summarize_c2pa(data)
+                    if summary:
+                        text_data[C2PA_KEY] = summary
+                elif chunk_type == b'eXIf':
+                    pillow_tags, _detailed = self.parse_exif(io.BytesIO(data), details=False)
+                    exif_data.update(pillow_tags)
+                else:
+                    decoded = decode_png_text_chunk(chunk_type, data, self.max_chunk_bytes, keys)
+                    if decoded:
+                        key, value = decoded
+                        text_data[f"PNG.{key}"] = value
+                        decoded_bytes += len(value)
+                        if self.max_metadata_bytes and decoded_bytes > self.max_metadata_bytes:
+                            raise LimitExceeded(f"decoded metadata exceeds {self.max_metadata_bytes:,} bytes")
+        
+        # Keep EXIF tags ahead of text chunks, as Pillow did
+        exif_data.update(text_data)
+        return exif_data
+    
+    @staticmethod
+    def _pillow_style_value(tag: Any) -> Any:
+        """Convert an exifread IfdTag value to the type Pillow's _getexif() would return"""
+        values = tag.values
+        if not isinstance(values, list):
+            return values  # ASCII tags are already decoded strings
+        if tag.field_type in (1, 7):  # BYTE / UNDEFINED
+            try:
+                return bytes(values)
+            except (TypeError, ValueError):
+                return values
+        if tag.field_type in (5, 10):  # RATIONAL / SRATIONAL: floats, like Pillow's IFDRational
+            values = [v.numerator / v.denominator if v.denominator else float('nan') for v in values]
+        return values[0] if len(values) == 1 else tuple(values)
+    
+    @staticmethod
+    def _read_user_comment(fh: BinaryIO) -> Optional[bytes]:
+        """Raw UserComment read straight from the EXIF IFD, or None"""
+        fh.seek(0)
+        tiff_start = len(EXIF_HEADER) if fh.read(len(EXIF_HEADER)) == EXIF_HEADER else 0
+        return exif_ifd_value(FileSlices(fh), USER_COMMENT_TAG, tiff_start)
+    
+    def parse_exif(self, fh: BinaryIO, details: bool = True) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Parse EXIF once, returning (Pillow-style tags, exifread-style tags)"""
+        pillow_tags = {}
+        detailed_tags = {}
+        gps_info = {}
+        tag_names = exif_tag_tables()[0]
+        exifread = load_exifread()
+        
+        # Thumbnails are dropped from the output anyway, so don't extract them
+        with timed('exifread'):
+            tags = exifread.process_file(fh, details=details, extract_thumbnail=False)
+            # details=False also makes exifread skip UserComment, which detection needs
+            user_comment = self._read_user_comment(fh) if not details and 'Image ExifOffset' in tags else None
+        for key, tag in tags.items():
+            if key.startswith('JPEGThumbnail'):
+                continue
+            detailed_tags[key] = str(tag)
+            
+            if not hasattr(tag, 'tag'):
+                continue
+            ifd_name = key.split(' ', 1)[0]
+            if ifd_name == 'GPS':
+                gps_info[tag.tag] = self._pillow_style_value(tag)
+            elif ifd_name in PILLOW_MERGED_IFDS and not key.startswith('EXIF SubIFD'):
+                pillow_tags[tag_names.get(tag.tag, tag.tag)] = self._pillow_style_value(tag)
+        
+        if user_comment is not None:
+            from exifread.tags.exif import EXIF_TAGS
+            pillow_tags['UserComment'] = user_comment
+            detailed_tags['EXIF UserComment'] = EXIF_TAGS[USER_COMMENT_TAG][1](list(user_comment))
+        if gps_info:
+            pillow_tags['GPSInfo'] = gps_info
+        
+        return pillow_tags, detailed_tags
+    
+    def read_metadata(self, source: 'ImageSource', details: bool = True,
+                      keys: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Read EXIF data and PNG metadata from a path, bytes or binary file object
+        
+        The container is identified by its magic number. Errors are raised, not printed.
+        keys (e.g. detection_keys) limits which PNG text chunks are decoded.
+        """
+        exif_data = {}
+        
+        with contextlib.ExitStack() as stack:
+            with timed('open'):
+                f = stack.enter_context(open_source(source, mapped=self.use_mmap))
+                image_format = sniff_image_format(f.read(8))
+                f.seek(0)
+            
+            if image_format is None:
+                raise ValueError("unrecognized image format")
+            if STATS is not None:
+                STATS.count_format(image_format)
+            if image_format == 'png':
+                # PNG: read metadata chunks only, never decompress IDAT
+                return self.read_png_metadata(f, keys)
+            
+            # JPEG/TIFF: one EXIF parse yielding both tag naming styles
+            c2pa_summary = None
+            if image_format == 'jpeg':
+                with timed('jpeg_segments'):
+                    payload, jumbf = read_jpeg_metadata_segments(f, c2pa=keys is None or C2PA_KEY in keys,
+                                                                 max_bytes=self.max_metadata_bytes)
+                exif_source = io.BytesIO(payload) if payload else None
+                c2pa_summary = summarize_c2pa(jumbf) if jumbf else None
+            else:
+                if self.max_metadata_bytes:
+                    with timed('tiff_ifds'):
+                        metadata_bytes = tiff_metadata_size(f)
+                    if metadata_bytes > self.max_metadata_bytes:
+                        raise LimitExceeded(f"TIFF tags exceed {self.max_metadata_bytes:,} bytes")
+                exif_source = f
+            
+            if exif_source is not None:
+                pillow_tags, detailed_tags = self.parse_exif(exif_source, details=details)
+                exif_data.update(pillow_tags)
+                exif_data.update(detailed_tags)
+            if c2pa_summary:
+                exif_data[C2PA_KEY] = c2pa_summary
+        
+        return exif_data
+    
+    def read_exif_data(self, filepath: 'ImageSource', details: bool = True,
+                       keys: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Read EXIF data and PNG metadata from image file
+        
+        details=False skips MakerNote decoding, which dominates the cost for camera JPEGs.
+        keys=self.detection_keys decodes only the PNG text chunks detection looks at.
+        """
+        exif_data = {}
+        
+        try:
+            exif_data.update(self.read_metadata(filepath, details=details, keys=keys))
+        except LimitExceeded:
+            raise  # Callers report the file as skipped
+        except Exception as e:
+            print(f"Warning: Could not read metadata from {source_name(filepath)}: {e}")
+            if STATS is not None:
+                STATS.count('read_errors')
+            
+        return exif_data
+    
+    def match_ai_keywords(self, value_lower: str) -> Set[str]:
+        """Return the AI keywords found in an already lowercased value, in a single pass"""
+        return set(self.AI_KEYWORD_PATTERN.findall(value_lower))
+    
+    def classify_ai_metadata(self, exif_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+        """Find potential AI generation metadata, plus the keywords matched for each tag
+        
+        Tags claimed by a registered generator detector are flagged by their key alone;
+        keyword matching only runs on the remaining AI_GENERATION_TAGS.
+        """
+        flagged = set()
+        keyword_hits = {}
+        
+        for _detector, _values, tags in detect_generators(exif_data):
+            flagged.update(tags)
+        
+        for tag, value in exif_data.items():
+            # Check if tag is in our list of AI-related tags
+            tag_name = metadata_key(tag)
+            if tag in flagged or tag_name not in self.AI_TAG_SET:
+                continue
+            
+            # Check if value contains AI-related keywords
+            value_str = str(value)
+            keywords = self.match_ai_keywords(value_str.lower())
+            if keywords:
+                flagged.add(tag)
+                keyword_hits[tag] = sorted(keywords)
+            elif tag_name in self.SOFTWARE_TAGS:
+                # Include all software tags as they might indicate generation tools
+                flagged.add(tag)
+            elif len(value_str) > 50:  # Long descriptions might be prompts
+                flagged.add(tag)
+        
+        ai_metadata = {tag: value for tag, value in exif_data.items() if tag in flagged}
+        return ai_metadata, keyword_hits
+    
+    def identify_generators(self, ai_metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Structured parse of each recognised generator format: {'generator': name, 'prompt': ...}"""
+        return [{'generator': detector.name, **detector.parse(values)}
+                for detector, values, _tags in detect_generators(ai_metadata)]
+    
+    def find_ai_generation_metadata(self, exif_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Find potential AI generation metadata"""
+        return self.classify_ai_metadata(exif_data)[0]
+    
+    def display_metadata(self, filepath: str, exif_data: Dict[str, Any], ai_metadata: Dict[str, Any]):
+        """Display metadata information"""
+        print(f"\n{'='*60}")
+        print(f"File: {filepath}")
+        print(f"{'='*60}")
+        
+        if not exif_data:
             print("No EXIF data found.")
             return
             
-        if ai_metadata:
-            print("\n🤖 POTENTIAL AI GENERATION METADATA:")
-            print("-" * 40)
+        if ai_metadata:
+            print("\n🤖 POTENTIAL AI GENERATION METADATA:")
+            print("-" * 40)
+            for tag, value in ai_metadata.items():
+                print(f"{tag}: {value}")
+            for generator in self.identify_generators(ai_metadata):
+                print(format_generator(generator))
+        
+        print(f"\n📊 ALL EXIF DATA ({len(exif_data)} tags):")
+        print("-" * 40)
+        for tag, value in sorted(exif_data.items()):
+            # Truncate very long values
+            value_str = str(value)
+            if len(value_str) > 100:
+                value_str = value_str[:97] + "..."
+            print(f"{tag}: {value_str}")
+    
+    def _backup_path(self, filepath: str) -> str:
+        """Where the original of filepath is kept: next to it, or mirrored under backup_dir"""
+        if not self.backup_dir:
+            return f"{filepath}.backup"
+        relative = os.path.splitdrive(os.path.abspath(filepath))[1].lstrip(os.sep + (os.altsep or ''))
+        backup_path = os.path.join(self.backup_dir, relative) + '.backup'
+        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+        return backup_path
+    
+    def _copy_for_backup(self, filepath: str, backup_path: str):
+        """Copy filepath to backup_path, sharing extents via reflink where the filesystem allows"""
+        if os.path.lexists(backup_path):
+            os.unlink(backup_path)
+        if not reflink_copy(filepath, backup_path):
+            import shutil
+            shutil.copy2(filepath, backup_path)
+            count_written(backup_path)
+    
+    def _swap_in(self, filepath: str, temp_path: str) -> Optional[str]:
+        """Atomically replace filepath with temp_path, keeping the original as backup
+        
+        The original is kept by hardlink (or rename) rather than copied, so no file
+        data is duplicated. Returns the backup path, or None when backups are disabled.
+        """
+        if not self.backup:
+            os.replace(temp_path, filepath)
+            return None
+        
+        with timed('backup'):
+            backup_path = self._backup_path(filepath)
+            if os.path.lexists(backup_path):
+                os.unlink(backup_path)
+            try:
+                os.link(filepath, backup_path)
+            except OSError:
+                try:
+                    os.replace(filepath, backup_path)  # Same filesystem, no hardlink support
+                except OSError:
+                    self._copy_for_backup(filepath, backup_path)  # Backup dir on another filesystem
+        os.replace(temp_path, filepath)
+        return backup_path
+    
+    def _rewrite_file(self, filepath: str, write: Callable[[BinaryIO, BinaryIO], Any]) -> Tuple[Any, Optional[str]]:
+        """Write a new version of filepath with write(src, dst) and swap it in
+        
+        The output goes to a temp file in the same directory, so a crash never leaves a
+        truncated original. Returns (result of write, backup path).
+        """
+        import shutil
+        import tempfile
+        
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, temp_path = tempfile.mkstemp(prefix='.promptsniffer-', suffix='.tmp', dir=directory)
+        try:
+            with open_source(filepath, sequential=True, mapped=self.use_mmap) as src, os.fdopen(fd, 'wb') as dst:
+                with timed('rewrite'):
+                    result = write(src, dst)
+                if STATS is not None:
+                    STATS.count('bytes_written', dst.tell())
+            shutil.copymode(filepath, temp_path)
+            backup_path = self._swap_in(filepath, temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return result, backup_path
+    
+    def _patch_copy(self, filepath: str, patch: Callable[[BinaryIO], Any]) -> Optional[str]:
+        """Apply patch(f) to a copy of filepath opened for update and swap the copy in
+        
+        The copy is a reflink clone where the filesystem allows, so only the patched
+        blocks are written; like _rewrite_file, a crash never leaves a half-patched
+        original. Returns the backup path.
+        """
+        import shutil
+        import tempfile
+        
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, temp_path = tempfile.mkstemp(prefix='.promptsniffer-', suffix='.tmp', dir=directory)
+        os.close(fd)
+        try:
+            with timed('rewrite'):
+                if not reflink_copy(filepath, temp_path):
+                    shutil.copyfile(filepath, temp_path)
+                    count_written(temp_path)
+                with open(temp_path, 'r+b') as f:
+                    patch(f)
+            shutil.copymode(filepath, temp_path)
+            return self._swap_in(filepath, temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+    
+    def remove_ai_metadata(self, filepath: str, reencode: bool = False) -> bool:
+        """Remove AI generation metadata from image
+        
+        PNG and JPEG files are stripped losslessly at the container level; TIFF files,
+        or any file when reencode=True, are decoded and re-encoded without metadata.
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                stripper = None if reencode else CONTAINER_STRIPPERS.get(sniff_image_format(f.read(8)))
+            if stripper is None:
+                stripper = self._reencode_without_metadata
+            
+            _removed, backup_path = self._rewrite_file(filepath, stripper)
+            
+            print(f"✓ Removed metadata from {filepath}")
+            if backup_path:
+                print(f"  Backup saved as: {backup_path}")
+            return True
+            
+        except LimitExceeded as e:
+            print(f"⚠️ Skipped {filepath}: {e}")
+            return False
+        except Exception as e:
+            print(f"✗ Error removing metadata from {filepath}: {e}")
+            return False
+    
+    @staticmethod
+    def _flagged_tags(ai_metadata: Dict[str, Any]) -> Tuple[Set[int], Set[str]]:
+        """Map detected AI tags to (EXIF tag ids, PNG text keywords)"""
+        exif_ids = set()
+        text_keys = set()
+        for tag in ai_metadata:
+            if isinstance(tag, int):
+                exif_ids.add(tag)
+                continue
+            if tag.startswith('PNG.'):
+                text_keys.add(tag[4:])
+                continue
+            
+            # Pillow-style 'Software' or exifread-style 'Image Software' / 'GPS GPSLatitude'
+            ifd_name, _, name = tag.rpartition(' ')
+            _, exif_tag_ids, gps_tag_ids = exif_tag_tables()
+            if ifd_name == 'GPS':
+                tag_id = gps_tag_ids.get(name)
+            else:
+                tag_id = exif_tag_ids.get(name)
+            if tag_id is not None:
+                exif_ids.add(tag_id)
+        return exif_ids, text_keys
+    
+    def _remove_png_tags(self, filepath: str, exif_ids: Set[int], text_keys: Set[str],
+                         c2pa: bool = False) -> Tuple[int, Optional[str]]:
+        """Drop flagged text chunks, tags from eXIf and (with c2pa) C2PA manifests, streaming all other chunks through"""
+        removed = 0
+        
+        def transform(chunk_type: bytes, data: bytes) -> Optional[bytes]:
+            nonlocal removed
+            if chunk_type == PNG_C2PA_CHUNK:
+                if not c2pa:
+                    return data
+                removed += 1
+                return None
+            if chunk_type == b'eXIf':
+                buf = bytearray(data)
+                removed += filter_ifd_tags(buf, exif_ids)
+                return bytes(buf)
+            if data.split(b'\0', 1)[0].decode('latin-1') in text_keys:
+                removed += 1
+                return None
+            return data
+        
+        def write(src: BinaryIO, dst: BinaryIO):
+            strip_png_chunks(src, dst, transform=transform)
+            if not removed:
+                raise _NothingRemoved()
+        
+        try:
+            _result, backup_path = self._rewrite_file(filepath, write)
+        except _NothingRemoved:
+            return 0, None  # The temp file is discarded, the original never replaced
+        return removed, backup_path
+    
+    def _remove_jpeg_tags(self, filepath: str, exif_ids: Set[int], c2pa: bool = False) -> Tuple[int, Optional[str]]:
+        """Remove flagged EXIF tags and (with c2pa) APP11 C2PA segments from a JPEG
+        
+        The EXIF block is planned on a private copy, so the file is only touched if it
+        changes. Tag removal alone patches a reflinked copy; dropping segments rewrites
+        the header segments and streams the image data through.
+        """
+        removed = 0
+        manifests = 0
+        exif = None
+        with open(filepath, 'rb') as f:
+            for marker, offset, length in iter_jpeg_segments(f):
+                if marker == JPEG_APP11:
+                    manifests += 1
+                elif marker == JPEG_APP1 and exif is None and exif_ids and length >= len(EXIF_HEADER):
+                    payload = f.read(length)
+                    if payload.startswith(EXIF_HEADER):
+                        buf = bytearray(payload[len(EXIF_HEADER):])
+                        removed = filter_ifd_tags(buf, exif_ids)
+                        exif = (offset + len(EXIF_HEADER), buf)
+        
+        if c2pa and manifests:
+            exif_pending = bool(removed)
+            
+            def transform(marker: int, data: bytes) -> Optional[bytes]:
+                nonlocal exif_pending
+                if marker == JPEG_APP11:
+                    return None
+                if exif_pending and data.startswith(EXIF_HEADER):
+                    exif_pending = False
+                    return EXIF_HEADER + bytes(exif[1])
+                return data
+            
+            _bytes_removed, backup_path = self._rewrite_file(
+                filepath, lambda src, dst: strip_jpeg_segments(src, dst, {JPEG_APP1, JPEG_APP11}, transform))
+            return removed + manifests, backup_path
+        
+        if not removed:
+            return 0, None
+        
+        def patch(f: BinaryIO):
+            offset, buf = exif
+            f.seek(offset)
+            f.write(buf)
+            if STATS is not None:
+                STATS.count('bytes_written', len(buf))
+        return removed, self._patch_copy(filepath, patch)
+    
+    def remove_ai_tags(self, filepath: str, ai_metadata: Dict[str, Any]) -> bool:
+        """Remove only the tags flagged in ai_metadata, keeping all other metadata intact
+        
+        JPEG and TIFF files are patched (only the IFD tables and the removed values are
+        written) in a reflinked copy that replaces the original; PNG chunks are filtered
+        while IDAT is copied through undecoded. Files with nothing to remove are not touched.
+        """
+        if not ai_metadata:
+            print(f"No AI metadata found in {filepath} to remove")
+            return False
+        
+        try:
+            exif_ids, text_keys = self._flagged_tags(ai_metadata)
+            
+            with open(filepath, 'rb') as f:
+                image_format = sniff_image_format(f.read(8))
+            
+            c2pa = C2PA_KEY in ai_metadata
+            if image_format == 'png':
+                removed, backup_path = self._remove_png_tags(filepath, exif_ids, text_keys, c2pa)
+            elif image_format == 'jpeg':
+                removed, backup_path = self._remove_jpeg_tags(filepath, exif_ids, c2pa)
+            elif image_format == 'tiff':
+                removed, backup_path = 0, None
+                if exif_ids:
+                    # A copy-on-write map counts the removable tags without writing to the file
+                    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) as buf:
+                        removed = filter_ifd_tags(buf, exif_ids)
+                if removed:
+                    def patch(f: BinaryIO):
+                        with mmap.mmap(f.fileno(), 0) as buf:
+                            filter_ifd_tags(buf, exif_ids)
+                            buf.flush()
+                    backup_path = self._patch_copy(filepath, patch)
+            else:
+                raise ValueError("unsupported image format")
+            
+            if not removed:
+                print(f"✗ No removable AI metadata in {filepath}; the file was left unchanged")
+                return False
+            print(f"✓ Removed {removed} AI metadata tag(s) from {filepath}")
+            if backup_path:
+                print(f"  Backup saved as: {backup_path}")
+            return True
+            
+        except Exception as e:
+            print(f"✗ Error removing AI metadata from {filepath}: {e}")
+            return False
+    
+    def _reencode_without_metadata(self, src: BinaryIO, dst: BinaryIO):
+        """Decode the image and save it again without metadata (lossy for JPEG)
+        
+        Only the header is read before the pixel count is checked against max_pixels,
+        and the decoded image is not copied, so one image is held in memory at a time.
+        """
+        Image = load_pillow_image()
+        # Pillow's own bomb check (about 179M pixels by default) would override max_pixels,
+        # including max_pixels=0 for no limit; it only runs in open(), so it is lifted there
+        with _PILLOW_LIMIT_LOCK:
+            saved_limit = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+            try:
+                img = Image.open(src)
+            finally:
+                Image.MAX_IMAGE_PIXELS = saved_limit
+        
+        with img:
+            width, height = img.size
+            if self.max_pixels and width * height > self.max_pixels:
+                raise LimitExceeded(f"{width}x{height} image exceeds {self.max_pixels:,} pixels for re-encoding")
+            
+            image_format = img.format
+            if image_format == 'PNG':
+                # For PNG files, remove text chunks but preserve other PNG metadata
+                clean_info = {}
+                # Keep essential PNG chunks, exclude text-based ones
+                essential_keys = ['transparency', 'gamma', 'dpi', 'aspect']
+                for key, value in img.info.items():
+                    if key in essential_keys:
+                        clean_info[key] = value
+                img.info = clean_info
+                
+                img.save(dst, 'PNG', optimize=True)
+            else:
+                # For JPEG/TIFF files, remove EXIF data
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGB')
+                
+                # Save without EXIF data
+                img.save(dst, image_format, optimize=True, exif=b'')
+
+
+# (exif_data, ai_metadata, keyword_hits) for one file
+ScanRecord = Tuple[Dict[str, Any], Dict[str, Any], Dict[str, List[str]]]
+
+
+class MetadataCache:
+    """SQLite cache of scan results, keyed by path and validated by size, mtime and inode"""
+    
+    SCHEMA_VERSION = 3  # 2: bytes values stored losslessly; 3: UserComment without MakerNotes, float rationals
+    DEFAULT_MAX_ENTRIES = 1_000_000
+    DEFAULT_MAX_MB = 1024
+    COMMIT_INTERVAL = 500
+    
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_mb: int = DEFAULT_MAX_MB, rebuild: bool = False):
+        import sqlite3
+        
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._pending_keys = {}
+        self._uncommitted = 0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if rebuild or version != self.SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS files")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                details INTEGER NOT NULL,
+                exif_json TEXT NOT NULL,
+                ai_json TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+        self._db.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self._db.commit()
+    
+    @staticmethod
+    def _file_key(filepath: str) -> Tuple[int, int, int]:
+        st = os.stat(filepath)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+    
+    @staticmethod
+    def _to_cacheable(exif_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten values to JSON-safe types
+        
+        bytes are kept losslessly (detectors decode e.g. UserComment from them); anything
+        else non-scalar is only ever formatted with str(), so it is stored that way.
+        """
+        import base64
+        
+        cacheable = {}
+        for tag, value in exif_data.items():
+            if isinstance(value, bytes):
+                value = {'__bytes__': base64.b64encode(value).decode('ascii')}
+            elif not isinstance(value, (str, int, float)):
+                value = str(value)
+            cacheable[str(tag)] = value
+        return cacheable
+    
+    @staticmethod
+    def _from_cacheable(value: Dict[str, Any]) -> Any:
+        """json.loads object_hook restoring the bytes values written by _to_cacheable"""
+        if len(value) == 1 and '__bytes__' in value:
+            import base64
+            return base64.b64decode(value['__bytes__'])
+        return value
+    
+    def _maybe_commit(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_INTERVAL:
+            self._db.commit()
+            self._uncommitted = 0
+    
+    def get(self, filepath: str, details: bool = True) -> Optional[ScanRecord]:
+        """Return the cached record for an unchanged file, or None on a miss"""
+        import json
+        
+        path = os.path.abspath(filepath)
+        try:
+            key = self._file_key(path)
+        except OSError:
+            return None
+        
+        row = self._db.execute(
+            "SELECT size, mtime_ns, inode, details, exif_json, ai_json FROM files WHERE path = ?",
+            (path,)).fetchone()
+        if row is None or tuple(row[:3]) != key or row[3] < int(details):
+            self.misses += 1
+            self._pending_keys[path] = key  # Only misses are put() back
+            return None
+        
+        self.hits += 1
+        self._db.execute("UPDATE files SET last_access = ? WHERE path = ?", (time.time(), path))
+        self._maybe_commit()
+        
+        exif_data = json.loads(row[4], object_hook=self._from_cacheable)
+        ai = json.loads(row[5])
+        ai_metadata = {tag: exif_data[tag] for tag in ai['tags'] if tag in exif_data}
+        return exif_data, ai_metadata, ai['keywords']
+    
+    def put(self, filepath: str, record: ScanRecord, details: bool = True):
+        """Store a freshly read record, keyed by the file state seen at get() time"""
+        import json
+        
+        exif_data, ai_metadata, keyword_hits = record
+        path = os.path.abspath(filepath)
+        key = self._pending_keys.pop(path, None)
+        if key is None:
+            try:
+                key = self._file_key(path)
+            except OSError:
+                return
+        
+        exif_json = json.dumps(self._to_cacheable(exif_data), ensure_ascii=False)
+        ai_json = json.dumps({'tags': [str(tag) for tag in ai_metadata], 'keywords': keyword_hits},
+                             ensure_ascii=False)
+        self._db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, *key, int(details), exif_json, ai_json, len(exif_json) + len(ai_json), time.time()))
+        self._maybe_commit()
+    
+    def evict(self):
+        """Drop least recently used entries until the entry count and size limits are met"""
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM files").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        
+        doomed = []
+        for path, nbytes in self._db.execute("SELECT path, nbytes FROM files ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((path,))
+            count -= 1
+            total -= nbytes
+        self._db.executemany("DELETE FROM files WHERE path = ?", doomed)
+    
+    def close(self):
+        self.evict()
+        self._db.commit()
+        self._db.close()
+
+
+def _new_content_hash():
+    """Fast 128-bit hash: xxHash (XXH3) when the xxhash package is installed, else BLAKE2b"""
+    try:
+        import xxhash
+        return xxhash.xxh3_128()
+    except ImportError:
+        import hashlib
+        return hashlib.blake2b(digest_size=16)
+
+
+def content_digest(filepath: str, mode: str = 'full', max_metadata_bytes: int = 0) -> bytes:
+    """Hash a file's whole content ('full'), or only the part metadata is read from ('metadata')
+    
+    In metadata mode PNG files hash their metadata chunks and JPEG files their header
+    segments, so pixel data is never read; TIFF metadata is scattered, so TIFF files
+    are always hashed in full.
+    """
+    digest = _new_content_hash()
+    with open_source(filepath, sequential=mode == 'full') as f:
+        image_format = sniff_image_format(f.read(8)) if mode == 'metadata' else None
+        f.seek(0)
+        if image_format == 'png':
+            for chunk_type, data in iter_png_chunks(f, PNG_STRIP_CHUNKS,
+                                                    max_bytes=max_metadata_bytes):
+                digest.update(struct.pack('>4sI', chunk_type, len(data)))
+                digest.update(data)
+        elif image_format == 'jpeg':
+            for marker, _offset, length in iter_jpeg_segments(f):
+                digest.update(struct.pack('>BH', marker, length))
+                digest.update(f.read(length))
+        elif hasattr(f, 'read_view'):
+            while True:
+                view = f.read_view(COPY_BUFFER_SIZE)  # Hashed straight from the memory map
+                if not view:
+                    break
+                digest.update(view)
+        else:
+            buffer = bytearray(COPY_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                digest.update(view[:n])
+    return digest.digest()
+
+
+class DuplicateIndex:
+    """Content hashes seen during a --dedupe run, the duplicate groups and recent scan records
+    
+    Records of the most recent unique files are kept so later copies can reuse them
+    instead of being read again; older copies are simply re-read.
+    """
+    
+    MAX_RECORDS = 4096
+    
+    def __init__(self, mode: str = 'full', max_metadata_bytes: int = 0):
+        self.mode = mode
+        self.max_metadata_bytes = max_metadata_bytes
+        self.originals = {}  # digest -> first path seen
+        self.duplicates = {}  # digest -> later paths with the same digest
+        self.duplicate_bytes = 0
+        self._records = collections.OrderedDict()
+    
+    def check(self, filepath: str) -> Tuple[Optional[bytes], Optional[str], Optional[ScanRecord]]:
+        """(digest, path of the first identical file or None, that file's record if still held)"""
+        try:
+            digest = content_digest(filepath, self.mode, self.max_metadata_bytes)
+        except (OSError, ValueError, LimitExceeded):
+            return None, None, None  # Processed normally, which reports the problem
+        
+        original = self.originals.setdefault(digest, filepath)
+        if original == filepath:
+            return digest, None, None
+        
+        self.duplicates.setdefault(digest, []).append(filepath)
+        try:
+            self.duplicate_bytes += os.path.getsize(filepath)
+        except OSError:
+            pass
+        record = self._records.get(digest)
+        if record is not None:
+            self._records.move_to_end(digest)
+        return digest, original, record
+    
+    def put(self, digest: Optional[bytes], record: Optional[ScanRecord]):
+        if digest is None or record is None:
+            return
+        self._records[digest] = record
+        self._records.move_to_end(digest)
+        while len(self._records) > self.MAX_RECORDS:
+            self._records.popitem(last=False)
+    
+    def print_summary(self, verbose: bool = False):
+        copies = sum(len(paths) for paths in self.duplicates.values())
+        what = "identical files" if self.mode == 'full' else "files with identical metadata"
+        print(f"\n🔁 Duplicates: {copies} redundant file(s) in {len(self.duplicates)} group(s) of {what}, "
+              f"{self.duplicate_bytes / (1024 * 1024):.1f} MB")
+        if verbose:
+            for digest, paths in self.duplicates.items():
+                print(f"  {self.originals[digest]}")
+                for path in paths:
+                    print(f"    = {path}")
+    
+    def write_report(self, path: str):
+        """Write the duplicate groups as JSON"""
+        import json
+        
+        report = {
+            'mode': self.mode,
+            'redundant_bytes': self.duplicate_bytes,
+            'groups': [{'digest': digest.hex(), 'original': self.originals[digest], 'duplicates': paths}
+                       for digest, paths in self.duplicates.items()],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+class TopCounter:
+    """Approximate most frequent values in bounded memory (Space-Saving)
+    
+    Up to capacity distinct values are counted exactly. After that a new value takes
+    the place of the least counted one and inherits its count, so frequent values are
+    kept and no count is ever underestimated.
+    """
+    
+    MAX_VALUE_LENGTH = 200
+    
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts = {}
+    
+    def add(self, value: Any):
+        value = str(value)[:self.MAX_VALUE_LENGTH]
+        if value in self.counts:
+            self.counts[value] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[value] = 1
+        else:
+            evicted = min(self.counts, key=self.counts.get)
+            self.counts[value] = self.counts.pop(evicted) + 1
+    
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+# Exit codes for --fail-on; 1 (setup errors) and 2 (usage errors) are taken
+EXIT_FILES_FAILED = 3
+EXIT_AI_FOUND = 4
+
+
+class BatchReport:
+    """Totals for --summary / --report, accumulated per file in constant memory
+    
+    Counters are bounded by the number of formats, verdicts and detectors; models,
+    samplers and Software values go through TopCounter, and only the first
+    MAX_FAILURES failures are listed individually.
+    """
+    
+    TOP_N = 10
+    MAX_FAILURES = 100
+    
+    def __init__(self):
+        self.started = time.time()
+        self.files = 0
+        self.formats = collections.Counter()
+        self.verdicts = collections.Counter()
+        self.generators = collections.Counter()
+        self.software = TopCounter()
+        self.models = TopCounter()
+        self.samplers = TopCounter()
+        self.metadata_bytes = 0
+        self.bytes_reclaimed = 0
+        self.failures = []
+        self.failure_count = 0
+        self._lock = threading.Lock()
+    
+    def add(self, filepath: str, record: Optional[ScanRecord], error: Optional[str] = None,
+            size_before: Optional[int] = None, image_format: Optional[str] = None):
+        """Count one processed file; size_before is its size before --remove rewrote it
+        
+        The format is sniffed from the file's magic number unless image_format is given.
+        """
+        if image_format is None:
+            image_format = sniff_file_format(filepath)
+        generators = []
+        sizes = {}
+        if record is not None:
+            exif_data, ai_metadata, _keyword_hits = record
+            generators = ScanResult(filepath, record).generators
             for tag, value in ai_metadata.items():
-                print(f"{tag}: {value}")
+                # Pillow- and exifread-style names of one tag count once
+                sizes[metadata_key(tag)] = len(value) if isinstance(value, (str, bytes)) else len(str(value))
+            software = exif_data.get('Software', exif_data.get('Image Software'))
+        size_after = None
+        if size_before is not None:
+            try:
+                size_after = os.path.getsize(filepath)
+            except OSError:
+                pass
         
-        print(f"\n📊 ALL EXIF DATA ({len(exif_data)} tags):")
-        print("-" * 40)
-        for tag, value in sorted(exif_data.items()):
-            # Truncate very long values
-            value_str = str(value)
-            if len(value_str) > 100:
-                value_str = value_str[:97] + "..."
-            print(f"{tag}: {value_str}")
+        with self._lock:
+            self.files += 1
+            self.formats[image_format or 'other'] += 1
+            if size_after is not None:
+                self.bytes_reclaimed += size_before - size_after
+            if error is not None:
+                skipped = error.startswith(SKIPPED_PREFIX)
+                self.verdicts['skipped' if skipped else 'error'] += 1
+                self.failure_count += 1
+                if len(self.failures) < self.MAX_FAILURES:
+                    self.failures.append((filepath, error))
+                return
+            if record is None:
+                return
+            self.verdicts['ai' if ai_metadata else 'clean'] += 1
+            if not ai_metadata:
+                return
+            if software:
+                self.software.add(software)
+            for generator in generators:
+                self.generators[generator['generator']] += 1
+                if generator.get('model'):
+                    self.models.add(generator['model'])
+                if generator.get('sampler'):
+                    self.samplers.add(generator['sampler'])
+            if not generators:
+                self.generators['unrecognized'] += 1
+            self.metadata_bytes += sum(sizes.values())
+    
+    def exit_code(self, fail_on: Optional[List[str]]) -> int:
+        """Exit status under the --fail-on policy: failures first, then AI metadata found"""
+        fail_on = set(fail_on or ())
+        if any(self.verdicts[verdict] for verdict in fail_on & {'error', 'skipped'}):
+            return EXIT_FILES_FAILED
+        if 'ai' in fail_on and self.verdicts['ai']:
+            return EXIT_AI_FOUND
+        return 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Machine-readable report, as written by --report FILE"""
+        return {
+            'files': self.files,
+            'seconds': time.time() - self.started,
+            'formats': dict(self.formats),
+            'verdicts': dict(self.verdicts),
+            'generators': dict(self.generators),
+            'top_software': self.software.most_common(self.TOP_N),
+            'top_models': self.models.most_common(self.TOP_N),
+            'top_samplers': self.samplers.most_common(self.TOP_N),
+            'ai_metadata_bytes': self.metadata_bytes,
+            'bytes_reclaimed': self.bytes_reclaimed,
+            'failure_count': self.failure_count,
+            'failures': [{'path': path, 'error': error} for path, error in self.failures],
+        }
+    
+    def print_summary(self, file=None):
+        """Print the end-of-run totals"""
+        def out(line=""):
+            print(line, file=file)
+        
+        def ranked(counter: TopCounter) -> str:
+            return ", ".join(f"{value} ({count})" for value, count in counter.most_common(self.TOP_N))
+        
+        minutes, seconds = divmod(int(time.time() - self.started), 60)
+        out(f"\n📊 SUMMARY: {self.files} file(s) in {minutes // 60}:{minutes % 60:02d}:{seconds:02d}")
+        out("Formats: " + (", ".join(f"{k}={v}" for k, v in sorted(self.formats.items())) or "none"))
+        out("Verdicts: " + (", ".join(f"{k}={v}" for k, v in sorted(self.verdicts.items())) or "none"))
+        if self.generators:
+            out("Generators: " + ", ".join(f"{k}={v}" for k, v in self.generators.most_common()))
+        if self.software.counts:
+            out(f"Top software: {ranked(self.software)}")
+        if self.models.counts:
+            out(f"Top models: {ranked(self.models)}")
+        if self.samplers.counts:
+            out(f"Top samplers: {ranked(self.samplers)}")
+        out(f"AI metadata: {self.metadata_bytes:,} bytes")
+        if self.bytes_reclaimed:
+            out(f"Reclaimed by removal: {self.bytes_reclaimed:,} bytes")
+        if self.failure_count:
+            out(f"\n✗ {self.failure_count} file(s) failed or were skipped:")
+            for path, error in self.failures:
+                out(f"  {path}: {error}")
+            if self.failure_count > len(self.failures):
+                out(f"  ... and {self.failure_count - len(self.failures)} more")
+
+
+def open_report(args: argparse.Namespace) -> Optional[BatchReport]:
+    """A BatchReport when --summary, --report or --fail-on needs one"""
+    return BatchReport() if args.summary or args.report or args.fail_on else None
+
+
+def size_before_removal(filepath: str, args: argparse.Namespace) -> Optional[int]:
+    """File size to measure what --remove reclaims, or None when nothing is removed"""
+    if not (args.remove or args.remove_ai_only):
+        return None
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return None
+
+
+def finish_report(report: Optional[BatchReport], args: argparse.Namespace) -> int:
+    """Print and/or write the report; returns the --fail-on exit status"""
+    if report is None:
+        return 0
+    if args.summary:
+        report.print_summary(file=sys.stdout if args.format == 'text' else sys.stderr)
+    if args.report:
+        import json
+        try:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"Warning: Could not write report to {args.report}: {e}", file=sys.stderr)
+    return report.exit_code(args.fail_on)
+
+
+def processor_options(args: argparse.Namespace) -> Dict[str, Any]:
+    """ExifMetadataProcessor keyword arguments selected on the command line"""
+    return {
+        'backup': not args.no_backup,
+        'backup_dir': args.backup_dir,
+        'max_metadata_bytes': int(args.max_metadata_mb * (1 << 20)),
+        'max_chunk_bytes': int(args.max_chunk_mb * (1 << 20)),
+        'max_pixels': args.max_pixels,
+        # One-shot batches only: --watch may see files still being written and --serve any path
+        'use_mmap': not (args.watch or args.serve),
+    }
+
+
+def cache_path(args: argparse.Namespace) -> Optional[str]:
+    """Metadata cache selected by --cache / PROMPTSNIFFER_CACHE, unless --no-cache"""
+    if args.no_cache:
+        return None
+    return args.cache or os.environ.get('PROMPTSNIFFER_CACHE')
+
+
+def open_cache(args: argparse.Namespace) -> Optional[MetadataCache]:
+    """Open the metadata cache selected on the command line, if any"""
+    path = cache_path(args)
+    if not path:
+        return None
+    try:
+        return MetadataCache(path, max_entries=args.cache_max_entries,
+                             max_mb=args.cache_max_mb, rebuild=args.rebuild_cache)
+    except Exception as e:
+        print(f"Warning: Could not open metadata cache {path}: {e}")
+        return None
+
+
+def process_file(processor: ExifMetadataProcessor, filepath: str, args: argparse.Namespace,
+                 cached: Optional[ScanRecord] = None, source: Optional[ImageSource] = None,
+                 duplicate_of: Optional[str] = None) -> ScanRecord:
+    """Run the operation selected on the command line for a single file
+    
+    A cached record skips reading the file; the (possibly fresh) record is returned.
+    source, if given, is read instead of filepath (e.g. stdin data); filepath is then
+    only used for display. duplicate_of names an identical file already handled by
+    --dedupe, whose sidecar is not written again.
+    """
+    start = time.perf_counter() if STATS is not None else 0.0
+    
+    # Operations that only look at AI metadata can skip decoding other PNG text chunks,
+    # unless the record is also going to a cache, which must stay complete
+    keys = None
+    if (args.remove_ai_only or args.copy or args.save_metadata or (args.ai_only and args.format == 'text')) \
+            and not cache_path(args):
+        keys = processor.detection_keys
+    
+    if cached is not None:
+        exif_data, ai_metadata, keyword_hits = cached
+        if STATS is not None:
+            STATS.count('cached')
+    else:
+        # Read EXIF data; a file that can't be read fails here rather than looking clean
+        with timed('read'):
+            exif_data = processor.read_metadata(filepath if source is None else source,
+                                                details=not args.skip_makernotes, keys=keys)
+        with timed('keywords'):
+            ai_metadata, keyword_hits = processor.classify_ai_metadata(exif_data)
+    
+    # Shared by the copy/save paths so each JSON value is parsed at most once
+    parsed_metadata = ParsedMetadata.wrap(ai_metadata)
+    
+    if args.remove_ai_only:
+        # Remove only the tags flagged as AI metadata
+        with timed('strip'):
+            processor.remove_ai_tags(filepath, ai_metadata)
+    elif args.remove:
+        # Remove metadata
+        with timed('strip'):
+            success = processor.remove_ai_metadata(filepath, reencode=args.reencode)
+        if args.verbose and success:
+            print(f"Removed {len(exif_data)} EXIF tags from {filepath}")
+    elif args.copy:
+        # Copy metadata to clipboard
+        with timed('clipboard'):
+            processor.copy_ai_metadata_to_clipboard(parsed_metadata)
+    elif args.save_metadata:
+        # Save metadata to file
+        if duplicate_of:
+            print(f"↪ {filepath} is a duplicate of {duplicate_of}, not writing another sidecar")
+        else:
+            with timed('sidecar'):
+                processor.save_ai_metadata_to_file(filepath, parsed_metadata)
+    elif args.format == 'text':
+        # Display metadata
+        start_display = time.perf_counter() if STATS is not None else 0.0
+        if args.ai_only:
+            if ai_metadata:
+                print(f"\n🤖 AI Generation Metadata in {filepath}:")
+                for tag, value in ai_metadata.items():
+                    print(f"  {tag}: {value}")
+                for generator in processor.identify_generators(ai_metadata):
+                    print(f"  {format_generator(generator)}")
+            elif args.verbose:
+                print(f"\n{filepath}: No AI generation metadata detected")
+        else:
+            processor.display_metadata(filepath, exif_data, ai_metadata)
+        if STATS is not None:
+            STATS.add_time('display', time.perf_counter() - start_display)
+    
+    if STATS is not None:
+        STATS.record_file(filepath, time.perf_counter() - start, 'ai' if ai_metadata else 'clean')
+    return exif_data, ai_metadata, keyword_hits
+
+
+def report_failure(filepath: str, e: Exception) -> str:
+    """Print why filepath produced no record and return the error text for it"""
+    if isinstance(e, LimitExceeded):
+        print(f"⚠️ Skipped {filepath}: {e}")
+        verdict = 'skipped'
+    else:
+        print(f"Error processing {filepath}: {e}")
+        verdict = 'error'
+    if STATS is not None:
+        STATS.count_verdict(verdict)
+    return describe_error(e)
+
+
+class _ThreadLocalStdout:
+    """sys.stdout proxy that diverts writes to a per-thread buffer while one is set"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def _target(self):
+        buffer = getattr(self._local, 'buffer', None)
+        return self._stream if buffer is None else buffer
+    
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+    
+    def flush(self):
+        self._target().flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _install_output_capture():
+    """Route stdout through _ThreadLocalStdout so workers can capture their own prints"""
+    if not isinstance(sys.stdout, _ThreadLocalStdout):
+        sys.stdout = _ThreadLocalStdout(sys.stdout)
+
+
+@contextlib.contextmanager
+def capture_output(buffer: io.StringIO):
+    """Collect everything the current thread prints into buffer"""
+    stdout = sys.stdout
+    previous = stdout._local.__dict__.get('buffer')
+    stdout._local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        stdout._local.buffer = previous
+
+
+# Per-worker processor, created once by the pool initializer
+_worker_processor = None
+
+
+def _init_worker(processor_options: Dict[str, Any], collect_stats: bool = False):
+    """collect_stats gives a worker process its own RunStats, drained after every task"""
+    global _worker_processor, STATS
+    _install_output_capture()
+    _worker_processor = ExifMetadataProcessor(**processor_options)
+    if collect_stats:
+        STATS = RunStats()
+
+
+# (filepath, captured output, error message, scan record, drained worker stats)
+TaskResult = Tuple[str, str, Optional[str], Optional[ScanRecord], Optional[Dict[str, Any]]]
+
+
+def _process_file_task(filepath: str, args: argparse.Namespace, cached: Optional[ScanRecord] = None,
+                       duplicate_of: Optional[str] = None) -> TaskResult:
+    """Pool task: process one file and capture everything it prints"""
+    buffer = io.StringIO()
+    error = None
+    record = None
+    with capture_output(buffer):
+        try:
+            record = process_file(_worker_processor, filepath, args, cached, duplicate_of=duplicate_of)
+        except LimitExceeded as e:
+            error = report_failure(filepath, e)  # Shown inline, not in the failure list
+        except Exception as e:
+            error = str(e)
+    # Thread workers share the parent's STATS, process workers send theirs back
+    stats = STATS.drain() if STATS is not None and args.executor == 'process' else None
+    return filepath, buffer.getvalue(), error, record, stats
+
+
+def run_parallel(items: Iterable[Tuple[str, Optional[ScanRecord], Optional[str]]],
+                 args: argparse.Namespace) -> Iterator[TaskResult]:
+    """Process (filepath, cached record, duplicate of) items on a worker pool, yielding results in input order
+    
+    Only a bounded window of tasks is in flight, so the input may be a lazy iterator.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.executor == 'thread':
+        _install_output_capture()
+        executor = ThreadPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                      initargs=(processor_options(args),))
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                       initargs=(processor_options(args), STATS is not None))
+    
+    window = jobs * 4
+    pending = collections.deque()
+    with executor:
+        for filepath, cached, duplicate_of in items:
+            pending.append(executor.submit(_process_file_task, filepath, args, cached, duplicate_of))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def expand_file_patterns(patterns: List[str]) -> List[str]:
+    """Expand wildcard patterns to actual file paths"""
+    files = []
+    for pattern in patterns:
+        if '*' in pattern or '?' in pattern:
+            # Handle wildcards
+            matches = glob.glob(pattern)
+            files.extend(matches)
+        else:
+            # Handle single file
+            if os.path.exists(pattern):
+                files.append(pattern)
+            else:
+                print(f"Warning: File not found: {pattern}")
     
-    def remove_ai_metadata(self, filepath: str) -> bool:
-        """Remove AI generation metadata from image"""
+    return sorted(list(set(files)))  # Remove duplicates and sort
+
+
+def read_batch_paths(source: str) -> List[str]:
+    """Paths listed one per line in a file, or on standard input for '-'
+    
+    Blank lines are ignored and surrounding quotes removed, so the output of
+    Explorer's "Copy as path" can be pasted as is.
+    """
+    if source == '-':
+        data = sys.stdin.buffer.read()
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    paths = []
+    for line in data.decode('utf-8-sig').splitlines():
+        line = line.strip()
+        if len(line) > 1 and line[0] == line[-1] == '"':
+            line = line[1:-1]
+        if line:
+            paths.append(line)
+    return paths
+
+
+class ScanResult:
+    """Structured outcome of scanning one image"""
+    
+    def __init__(self, path: Optional[str], record: Optional[ScanRecord] = None, error: Optional[str] = None):
+        self.path = path
+        self.exif_data, self.ai_metadata, self.keyword_hits = record if record is not None else ({}, {}, {})
+        self.error = error if record is not None or error else 'no result'
+    
+    @property
+    def ai_generated(self) -> bool:
+        return bool(self.ai_metadata)
+    
+    @property
+    def keywords(self) -> List[str]:
+        return sorted({keyword for hits in self.keyword_hits.values() for keyword in hits})
+    
+    @property
+    def generators(self) -> List[Dict[str, Any]]:
+        """Structured generator parameters (prompt, seed, steps, model, ...) per detected format"""
+        return [{'generator': detector.name, **detector.parse(values)}
+                for detector, values, _tags in detect_generators(self.ai_metadata)]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready form, as emitted by --format jsonl"""
+        if self.error:
+            return {'path': self.path, 'error': self.error}
+        return {
+            'path': self.path,
+            'ai_generated': self.ai_generated,
+            'ai_tags': [str(tag) for tag in self.ai_metadata],
+            'keywords': self.keywords,
+            'generators': self.generators,
+            'tags': {str(tag): str(value) for tag, value in self.exif_data.items()},
+        }
+    
+    def __repr__(self):
+        return f"ScanResult(path={self.path!r}, ai_generated={self.ai_generated}, error={self.error!r})"
+
+
+class RecordWriter:
+    """Stream one machine-readable record per image as JSON Lines or CSV, flushing each one"""
+    
+    CSV_FIELDS = ['path', 'ai_generated', 'ai_tags', 'keywords', 'generators', 'tag_count', 'software', 'error']
+    
+    def __init__(self, stream, fmt: str = 'jsonl'):
+        self.stream = stream
+        self.format = fmt
+        self._csv = None
+        if fmt == 'csv':
+            import csv
+            self._csv = csv.DictWriter(stream, fieldnames=self.CSV_FIELDS)
+            self._csv.writeheader()
+    
+    def write(self, filepath: str, record: Optional[ScanRecord], error: Optional[str] = None):
+        data = ScanResult(filepath, record, error).to_dict()
+        if self._csv is not None:
+            tags = data.get('tags', {})
+            self._csv.writerow({
+                'path': filepath,
+                'ai_generated': data.get('ai_generated', ''),
+                'ai_tags': ';'.join(data.get('ai_tags', [])),
+                'keywords': ';'.join(data.get('keywords', [])),
+                'generators': ';'.join(g['generator'] for g in data.get('generators', [])),
+                'tag_count': len(tags) if record is not None else '',
+                'software': tags.get('Software', tags.get('Image Software', '')),
+                'error': data.get('error', ''),
+            })
+        else:
+            import json
+            self.stream.write(json.dumps(data, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+
+# Long-lived processor shared by the library API, so repeated calls pay no setup cost
+_default_processor = None
+
+
+def get_processor() -> ExifMetadataProcessor:
+    """Return the shared ExifMetadataProcessor used by scan()/scan_async()
+    
+    It does not memory-map files: a library caller may pass a path that is still being
+    written or truncated underneath it, which would fault a mapped read (SIGBUS).
+    Pass processor=ExifMetadataProcessor() to scan() to opt in for stable files.
+    """
+    global _default_processor
+    if _default_processor is None:
+        _default_processor = ExifMetadataProcessor(use_mmap=False)
+    return _default_processor
+
+
+def scan(source: ImageSource, details: bool = True,
+         processor: Optional[ExifMetadataProcessor] = None) -> ScanResult:
+    """Read and classify one image without printing anything
+    
+    source may be a path, bytes or a binary file object. Failures are reported in
+    ScanResult.error rather than raised.
+    """
+    processor = processor or get_processor()
+    name = source_name(source)
+    try:
+        exif_data = processor.read_metadata(source, details=details)
+        ai_metadata, keyword_hits = processor.classify_ai_metadata(exif_data)
+    except Exception as e:
+        return ScanResult(name, error=describe_error(e))
+    return ScanResult(name, (exif_data, ai_metadata, keyword_hits))
+
+
+async def scan_async(source: ImageSource, details: bool = True, executor: Optional[Any] = None) -> ScanResult:
+    """Awaitable scan() that runs on an executor, keeping the event loop free
+    
+    With executor=None the loop's default thread pool is used; pass a
+    ProcessPoolExecutor to spread CPU-bound parsing over cores.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(scan, source, details))
+
+
+DEFAULT_SERVE_ADDRESS = '127.0.0.1:8765'
+
+
+class ScanService:
+    """Warm processor behind a bounded worker pool, shared by all server connections
+    
+    At most max_pending items (a raw image, or one path of a batch) are accepted at
+    once; beyond that callers are told to back off instead of queueing without bound.
+    """
+    
+    MAX_BODY_BYTES = 256 * 1024 * 1024
+    
+    def __init__(self, processor: ExifMetadataProcessor, workers: int, max_pending: Optional[int] = None,
+                 details: bool = True):
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.processor = processor
+        self.details = details
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='promptsniffer')
+        self.max_pending = max_pending or workers * 4
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        _install_output_capture()
+    
+    def run_batch(self, fn: Callable[[Any], Dict[str, Any]], items: List[Any]) -> Optional[List[Dict[str, Any]]]:
+        """Fan a batch out over the pool; None if its items don't fit in the free slots"""
+        with self._pending_lock:
+            if self._pending + len(items) > self.max_pending:
+                return None
+            self._pending += len(items)
+        try:
+            return list(self.executor.map(fn, items))
+        finally:
+            with self._pending_lock:
+                self._pending -= len(items)
+    
+    def scan_item(self, source: ImageSource) -> Dict[str, Any]:
+        return scan(source, details=self.details, processor=self.processor).to_dict()
+    
+    def strip_item(self, path: str, ai_only: bool = False, reencode: bool = False) -> Dict[str, Any]:
+        """Run a removal, returning its outcome and the messages it printed"""
+        buffer = io.StringIO()
+        with capture_output(buffer):
+            if ai_only:
+                result = scan(path, details=self.details, processor=self.processor)
+                ok = result.error is None and self.processor.remove_ai_tags(path, result.ai_metadata)
+                if result.error:
+                    print(f"✗ Error reading {path}: {result.error}")
+            else:
+                ok = self.processor.remove_ai_metadata(path, reencode=reencode)
+        return {'path': path, 'ok': bool(ok), 'message': buffer.getvalue().strip()}
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ScanRequestHandler:
+    """HTTP front end for ScanService, mixed into http.server.BaseHTTPRequestHandler by serve()
+    
+    GET  /health                 -> {"status": "ok"}
+    POST /scan   raw image body  -> one result, as in --format jsonl
+    POST /scan   {"paths": [..]} -> {"results": [...]}
+    POST /strip  {"paths": [..], "ai_only": false, "reencode": false} -> {"results": [...]}
+    
+    JSON requests must be sent as application/json, so browsers have to preflight
+    them; requests from web pages (with an Origin header) and, on TCP, requests for
+    any Host but the bound address (DNS rebinding) are refused.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    service = None  # type: ScanService
+    verbose = False
+    allowed_hosts = None  # type: Optional[Set[str]]  # None: any Host (Unix sockets)
+    
+    def address_string(self) -> str:
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+    
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+    
+    def _send_json(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None):
+        import json
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _reject_foreign(self) -> bool:
+        """Answer 403 to requests from browsers or for another Host; True if rejected"""
+        if self.headers.get('Origin') is not None:
+            error = 'cross-origin requests are not allowed'
+        elif self.allowed_hosts is not None and (self.headers.get('Host') or '').lower() not in self.allowed_hosts:
+            error = 'unexpected Host header'
+        else:
+            return False
+        self.close_connection = True
+        self._send_json(403, {'error': error})
+        return True
+    
+    def do_GET(self):
+        if self._reject_foreign():
+            return
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+    
+    def do_POST(self):
+        import json
+        
+        if self._reject_foreign():
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_json(400, {'error': 'invalid Content-Length'})
+            return
+        if length > self.service.MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': 'request body too large'})
+            return
+        body = self.rfile.read(length)
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        
         try:
-            # Create backup filename
-            backup_path = f"{filepath}.backup"
-            
-            # Copy original file as backup
-            import shutil
-            shutil.copy2(filepath, backup_path)
-            
-            # Open image and remove metadata
-            with Image.open(filepath) as img:
-                if filepath.lower().endswith('.png'):
-                    # For PNG files, remove text chunks but preserve other PNG metadata
-                    img_clean = Image.new(img.mode, img.size)
-                    img_clean.putdata(list(img.getdata()))
-                    
-                    # Preserve essential PNG info but remove text chunks
-                    if hasattr(img, 'info'):
-                        clean_info = {}
-                        # Keep essential PNG chunks, exclude text-based ones
-                        essential_keys = ['transparency', 'gamma', 'dpi', 'aspect']
-                        for key, value in img.info.items():
-                            if key in essential_keys:
-                                clean_info[key] = value
-                        img_clean.info = clean_info
-                    
-                    img_clean.save(filepath, 'PNG', optimize=True)
+            if self.path == '/scan' and content_type != 'application/json':
+                results = self.service.run_batch(self.service.scan_item, [body])
+                single = True
+            elif content_type != 'application/json':
+                self._send_json(415, {'error': 'Content-Type must be application/json'})
+                return
+            else:
+                request = json.loads(body or b'{}')
+                if not isinstance(request, dict):
+                    self._send_json(400, {'error': 'request body must be a JSON object'})
+                    return
+                paths = request.get('paths')
+                if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                    self._send_json(400, {'error': '"paths" must be a list of strings'})
+                    return
+                if len(paths) > self.service.max_pending:
+                    self._send_json(413, {'error': f'at most {self.service.max_pending} paths per request'})
+                    return
+                single = False
+                if self.path == '/scan':
+                    results = self.service.run_batch(self.service.scan_item, paths)
+                elif self.path == '/strip':
+                    strip = functools.partial(self.service.strip_item, ai_only=bool(request.get('ai_only')),
+                                              reencode=bool(request.get('reencode')))
+                    results = self.service.run_batch(strip, paths)
                 else:
-                    # For JPEG/TIFF files, remove EXIF data
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        img = img.convert('RGB')
-                    
-                    # Save without EXIF data
-                    img.save(filepath, optimize=True, exif=b'')
-            
-            print(f"✓ Removed metadata from {filepath}")
-            print(f"  Backup saved as: {backup_path}")
-            return True
-            
-        except Exception as e:
-            print(f"✗ Error removing metadata from {filepath}: {e}")
-            return False
+                    self._send_json(404, {'error': 'not found'})
+                    return
+        except ValueError as e:
+            self._send_json(400, {'error': f'invalid request: {e}'})
+            return
+        
+        if results is None:
+            self._send_json(503, {'error': 'server busy'}, {'Retry-After': '1'})
+        elif single:
+            self._send_json(200, results[0])
+        else:
+            self._send_json(200, {'results': results})
 
 
-def expand_file_patterns(patterns: List[str]) -> List[str]:
-    """Expand wildcard patterns to actual file paths"""
-    files = []
-    for pattern in patterns:
-        if '*' in pattern or '?' in pattern:
-            # Handle wildcards
-            matches = glob.glob(pattern)
-            files.extend(matches)
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Run the --serve daemon until interrupted"""
+    import http.server
+    import socketserver
+    
+    workers = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    service = ScanService(ExifMetadataProcessor(**processor_options(args)), workers,
+                          details=not args.skip_makernotes)
+    handler = type('Handler', (ScanRequestHandler, http.server.BaseHTTPRequestHandler),
+                   {'service': service, 'verbose': args.verbose})
+    
+    address = args.serve
+    try:
+        if address.startswith('unix:'):
+            socket_path = address[len('unix:'):]
+            if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                os.unlink(socket_path)  # Stale socket from a previous run
+            server_class = type('UnixHTTPServer', (socketserver.ThreadingMixIn, socketserver.UnixStreamServer),
+                                {'daemon_threads': True})
+            server = server_class(socket_path, handler)
         else:
-            # Handle single file
-            if os.path.exists(pattern):
-                files.append(pattern)
-            else:
-                print(f"Warning: File not found: {pattern}")
+            host, _, port = address.rpartition(':')
+            host = host or '127.0.0.1'
+            server = http.server.ThreadingHTTPServer((host, int(port)), handler)
+            port = server.server_address[1]
+            names = {host, f'[{host}]'} | ({'localhost'} if host in ('127.0.0.1', '::1') else set())
+            handler.allowed_hosts = {f'{name}:{port}'.lower() for name in names}
+    except (OSError, ValueError) as e:
+        print(f"Error: Cannot listen on {address}: {e}")
+        return 1
     
-    return sorted(list(set(files)))  # Remove duplicates and sort
+    print(f"PromptSniffer serving on {address} with {workers} worker(s), press Ctrl+C to stop")
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)  # Shut down cleanly when stopped by a service manager
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if address.startswith('unix:') and os.path.exists(address[len('unix:'):]):
+            os.unlink(address[len('unix:'):])
+    return 0
 
 
-def main():
+def _matches_any(name: str, path: str, patterns: Optional[List[str]]) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern) for pattern in patterns or ())
+
+
+def walk_image_files(roots: Iterable[str], extensions: Set[str], include: Optional[List[str]] = None,
+                     exclude: Optional[List[str]] = None, follow_symlinks: bool = False) -> Iterator[str]:
+    """Lazily yield supported image files under roots using os.scandir
+    
+    Files are yielded as they are found (sorted within each directory). Duplicates from
+    overlapping roots or symlink loops are avoided by remembering visited directories,
+    so memory grows with the number of directories rather than files.
+    """
+    visited_dirs = set()
+    seen_files = set()  # Only explicitly named files, never the walked ones
+    
+    def wanted(name: str, path: str) -> bool:
+        if os.path.splitext(name)[1].lower() not in extensions:
+            return False
+        if include and not _matches_any(name, path, include):
+            return False
+        return not _matches_any(name, path, exclude)
+    
+    for pattern in roots:
+        if '*' in pattern or '?' in pattern:
+            matches = sorted(glob.iglob(pattern))
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            print(f"Warning: File not found: {pattern}")
+            continue
+        
+        for root in matches:
+            if not os.path.isdir(root):
+                key = os.path.realpath(root)
+                if key not in seen_files and wanted(os.path.basename(root), root):
+                    seen_files.add(key)
+                    yield root
+                continue
+            
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    st = os.stat(directory)
+                    if (st.st_dev, st.st_ino) in visited_dirs:
+                        continue
+                    visited_dirs.add((st.st_dev, st.st_ino))
+                    with os.scandir(directory) as it:
+                        entries = sorted(it, key=lambda entry: entry.name)
+                except OSError as e:
+                    print(f"Warning: Cannot read directory {directory}: {e}")
+                    continue
+                
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            if not _matches_any(entry.name, entry.path, exclude):
+                                subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=follow_symlinks) and wanted(entry.name, entry.path):
+                            yield entry.path
+                    except OSError:
+                        continue
+                
+                # Depth-first, visiting subdirectories in name order
+                stack.extend(reversed(subdirs))
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Read and optionally remove AI generation metadata from image files",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -471,13 +3470,29 @@ Examples:
   %(prog)s -c image.png                # Copy AI metadata to clipboard (single file only)
   %(prog)s -s *.jpg --verbose          # Save metadata from all JPG files
   %(prog)s folder\*.jpg --verbose     # Process all jpg files with verbose output
+  %(prog)s -j 8 --ai-only *.png        # Scan with 8 worker processes
+  %(prog)s -R --exclude "*thumb*" outputs   # Scan a directory tree recursively
+  %(prog)s -R --format jsonl outputs > scan.jsonl   # Stream one JSON record per image
+  cat upload.bin | %(prog)s --ai-only -           # Scan image data from standard input
+  %(prog)s --serve 127.0.0.1:8765 -j 8            # Run as a scan/strip daemon
+  %(prog)s --watch renders -R -r -j 4             # Strip metadata from new renders as they land
+  %(prog)s -R photos --ai-only --profile          # Show where the time goes, per stage
+  %(prog)s -R archive -s --dedupe                 # One sidecar per unique image, list duplicates
+  find outputs -name "*.png" | %(prog)s --ai-only --batch-from -   # Scan a list of paths in one process
+  %(prog)s -R assets --ai-only --summary --fail-on ai --fail-on error   # CI gate: no AI metadata, no errors
         """
     )
     
     parser.add_argument(
         'files',
-        nargs='+',
-        help='Image file(s) or wildcard patterns to process'
+        nargs='*',
+        help="Image file(s) or wildcard patterns to process ('-' reads one image from standard input)"
+    )
+    
+    parser.add_argument(
+        '--batch-from',
+        metavar='FILE',
+        help="Also process the paths listed one per line in FILE ('-' reads the list from standard input)"
     )
     
     parser.add_argument(
@@ -486,6 +3501,30 @@ Examples:
         help='Remove AI generation metadata from images'
     )
     
+    parser.add_argument(
+        '--remove-ai-only',
+        action='store_true',
+        help='Remove only the detected AI generation tags, keeping orientation, ICC and camera data'
+    )
+    
+    parser.add_argument(
+        '--backup-dir',
+        metavar='DIR',
+        help='Keep originals of modified files under DIR (mirroring their paths) instead of next to them'
+    )
+    
+    parser.add_argument(
+        '--no-backup',
+        action='store_true',
+        help='Do not keep originals of modified files'
+    )
+    
+    parser.add_argument(
+        '--reencode',
+        action='store_true',
+        help='With --remove, decode and re-encode images instead of stripping metadata losslessly'
+    )
+    
     parser.add_argument(
         '-s', '--save-metadata',
         action='store_true',
@@ -504,77 +3543,720 @@ Examples:
         help='Show verbose output'
     )
     
+    parser.add_argument(
+        '--skip-makernotes',
+        action='store_true',
+        help='Skip MakerNote decoding when reading EXIF (faster for camera JPEGs)'
+    )
+    
     parser.add_argument(
         '--ai-only',
         action='store_true',
         help='Only display potential AI generation metadata'
     )
     
-    args = parser.parse_args()
+    parser.add_argument(
+        '-R', '--recursive',
+        action='store_true',
+        help='Walk directories recursively, streaming supported files into processing as they are found'
+    )
+    
+    parser.add_argument(
+        '--include',
+        action='append',
+        metavar='GLOB',
+        help='With --recursive, only process files whose name or path matches GLOB (repeatable)'
+    )
     
-    # Expand file patterns
-    file_paths = expand_file_patterns(args.files)
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        metavar='GLOB',
+        help='With --recursive, skip files and directories whose name or path matches GLOB (repeatable)'
+    )
     
-    if not file_paths:
-        print("No files found matching the specified patterns.")
-        return 1
+    parser.add_argument(
+        '--follow-symlinks',
+        action='store_true',
+        help='With --recursive, follow symbolic links to files and directories'
+    )
+    
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Process files with N parallel workers (0 = one per CPU, default: 1)'
+    )
+    
+    parser.add_argument(
+        '--executor',
+        choices=['process', 'thread'],
+        default='process',
+        help='Worker pool type for --jobs; use "thread" for I/O-bound network mounts (default: process)'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        metavar='PATH',
+        help='SQLite metadata cache; unchanged files are not re-read (default: $PROMPTSNIFFER_CACHE)'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the metadata cache even if PROMPTSNIFFER_CACHE is set'
+    )
+    
+    parser.add_argument(
+        '--rebuild-cache',
+        action='store_true',
+        help='Discard all cached entries before scanning'
+    )
+    
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=MetadataCache.DEFAULT_MAX_ENTRIES,
+        metavar='N',
+        help=f'Evict least recently used cache entries beyond N (default: {MetadataCache.DEFAULT_MAX_ENTRIES})'
+    )
+    
+    parser.add_argument(
+        '--cache-max-mb',
+        type=int,
+        default=MetadataCache.DEFAULT_MAX_MB,
+        metavar='MB',
+        help=f'Evict least recently used cache entries beyond MB of stored metadata (default: {MetadataCache.DEFAULT_MAX_MB})'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        nargs='?',
+        const=DEFAULT_SERVE_ADDRESS,
+        metavar='ADDRESS',
+        help=f'Run as a daemon answering scan/strip requests over HTTP on HOST:PORT, or on a Unix '
+             f'socket given as unix:PATH (default: {DEFAULT_SERVE_ADDRESS}); --jobs sets the worker count'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        help='Watch DIR (recursively with -R) and process images as they are written, until interrupted'
+    )
+    
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=1.0,
+        metavar='SECONDS',
+        help='With --watch, wait until a file has not changed for SECONDS before processing it (default: 1.0)'
+    )
+    
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        metavar='SECONDS',
+        help='With --watch, rescan every SECONDS instead of using inotify (e.g. for network mounts)'
+    )
+    
+    parser.add_argument(
+        '--watch-queue',
+        type=int,
+        default=1000,
+        metavar='N',
+        help='With --watch, maximum number of files waiting for a worker (default: 1000)'
+    )
+    
+    parser.add_argument(
+        '--dedupe',
+        nargs='?',
+        const='full',
+        choices=['full', 'metadata'],
+        help='Process identical files once and reuse the result for every copy; '
+             '"metadata" compares only the metadata region instead of the whole file (default: full)'
+    )
+    
+    parser.add_argument(
+        '--dedupe-report',
+        metavar='FILE',
+        help='With --dedupe, write the duplicate groups to FILE as JSON'
+    )
+    
+    parser.add_argument(
+        '--max-metadata-mb',
+        type=float,
+        default=DEFAULT_MAX_METADATA_MB,
+        metavar='MB',
+        help=f'Skip files whose metadata (PNG chunks, TIFF tags, JPEG APP11) exceeds MB, raw or decoded (default: {DEFAULT_MAX_METADATA_MB}, 0 = no limit)'
+    )
+    
+    parser.add_argument(
+        '--max-chunk-mb',
+        type=float,
+        default=DEFAULT_MAX_CHUNK_MB,
+        metavar='MB',
+        help=f'Stop decompressing a zTXt/iTXt chunk at MB and skip the file (default: {DEFAULT_MAX_CHUNK_MB}, 0 = no limit)'
+    )
+    
+    parser.add_argument(
+        '--max-pixels',
+        type=int,
+        default=DEFAULT_MAX_PIXELS,
+        metavar='N',
+        help=f'Skip re-encoding images larger than N pixels (default: {DEFAULT_MAX_PIXELS:,}, 0 = no limit)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Time each processing stage and print a summary table when done'
+    )
+    
+    parser.add_argument(
+        '--stats',
+        metavar='FILE',
+        help='Collect the same timings and counters as --profile and write them to FILE as JSON'
+    )
+    
+    parser.add_argument(
+        '--slowest',
+        type=int,
+        default=10,
+        metavar='N',
+        help='Number of slowest files listed by --profile/--stats (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--summary',
+        action='store_true',
+        help='Print totals at the end: formats, verdicts, generators, top models/samplers, bytes, failures'
+    )
+    
+    parser.add_argument(
+        '--report',
+        metavar='FILE',
+        help='Write the end-of-run totals to FILE as JSON'
+    )
+    
+    parser.add_argument(
+        '--fail-on',
+        action='append',
+        choices=['error', 'skipped', 'ai'],
+        help=f'Exit with {EXIT_FILES_FAILED} if any file failed (error) or was skipped over the limits (skipped), '
+             f'or with {EXIT_AI_FOUND} if any file carries AI metadata (ai); repeatable'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'jsonl', 'csv'],
+        default='text',
+        help='Output format: human-readable text, one JSON record per line, or CSV (default: text)'
+    )
+    
+    parser.add_argument(
+        '-o', '--output',
+        metavar='PATH',
+        help='Write --format jsonl/csv records to PATH instead of stdout'
+    )
+    
+    return parser
+
+
+class InotifyWatcher:
+    """Report files closed after writing or moved into a directory tree (Linux inotify)"""
+    
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self, root: str, recursive: bool = False):
+        import ctypes
+        import ctypes.util
+        
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.recursive = recursive
+        self._dirs = {}
+        self._add_tree(root)
+    
+    def _add_watch(self, directory: str):
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), mask)
+        if wd >= 0:
+            self._dirs[wd] = directory
+    
+    def _add_tree(self, root: str):
+        self._add_watch(root)
+        if self.recursive:
+            for directory, subdirs, _files in os.walk(root):
+                for subdir in subdirs:
+                    self._add_watch(os.path.join(directory, subdir))
+    
+    def poll(self, timeout: float) -> List[str]:
+        """Wait up to timeout seconds and return paths of files that were written or moved in"""
+        import select
+        
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        
+        paths = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            
+            if mask & self.IN_Q_OVERFLOW:
+                print("Warning: Watch event queue overflowed, some files may have been missed")
+                continue
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if self.recursive and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._add_tree(path)
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                paths.append(path)
+        return paths
+    
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher that rescans a directory tree and reports new or changed files"""
+    
+    def __init__(self, root: str, recursive: bool = False, interval: float = 2.0):
+        self.root = root
+        self.recursive = recursive
+        self.interval = interval
+        self._known = self._snapshot()  # Files already present are not reported
+        self._next_scan = time.monotonic() + interval
+    
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        return snapshot
+    
+    def poll(self, timeout: float) -> List[str]:
+        time.sleep(max(0.0, min(timeout, self._next_scan - time.monotonic())))
+        if time.monotonic() < self._next_scan:
+            return []
+        self._next_scan = time.monotonic() + self.interval
+        
+        snapshot = self._snapshot()
+        changed = [path for path, key in snapshot.items() if self._known.get(path) != key]
+        self._known = snapshot
+        return changed
     
-    # Check if copy option is used with multiple files
-    if args.copy and len(file_paths) > 1:
-        print("Error: --copy option can only be used with a single file.")
+    def close(self):
+        pass
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class WatchState:
+    """Files being processed and the state we left them in, so our own writes don't retrigger"""
+    
+    MAX_REMEMBERED = 10000
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._written = collections.OrderedDict()
+    
+    def claim(self, path: str) -> bool:
+        """Mark path as in flight, unless it is already or is unchanged since we processed it"""
+        key = _stat_key(path)
+        with self._lock:
+            if path in self._in_flight or (key is not None and self._written.get(path) == key):
+                return False
+            self._in_flight.add(path)
+            return True
+    
+    def release(self, path: str):
+        key = _stat_key(path)
+        with self._lock:
+            self._written[path] = key
+            self._written.move_to_end(path)
+            while len(self._written) > self.MAX_REMEMBERED:
+                self._written.popitem(last=False)
+            self._in_flight.discard(path)
+
+
+def settled_files(watcher: Any, settle: float) -> Iterator[str]:
+    """Yield watched paths once their size and mtime have stopped changing for settle seconds"""
+    pending = {}  # path -> (stat key, deadline)
+    while True:
+        for path in watcher.poll(settle / 2 if pending else 1.0):
+            pending[path] = (_stat_key(path), time.monotonic() + settle)
+        
+        now = time.monotonic()
+        for path, (key, deadline) in list(pending.items()):
+            if deadline > now:
+                continue
+            current = _stat_key(path)
+            if current is None:
+                del pending[path]  # Deleted or renamed away before it settled
+            elif current != key:
+                pending[path] = (current, now + settle)  # Still being written
+            else:
+                del pending[path]
+                yield path
+
+
+def watch(processor: ExifMetadataProcessor, args: argparse.Namespace,
+          writer: Optional['RecordWriter'] = None) -> int:
+    """Process images as they land in the --watch directory until interrupted"""
+    root = args.watch
+    if not os.path.isdir(root):
+        print(f"Error: Not a directory: {root}")
         return 1
     
-    processor = ExifMetadataProcessor()
+    watcher = None
+    if args.poll_interval is None:
+        try:
+            watcher = InotifyWatcher(root, recursive=args.recursive)
+        except OSError as e:
+            if args.verbose:
+                print(f"inotify unavailable ({e}), polling instead")
+    if watcher is None:
+        watcher = PollingWatcher(root, recursive=args.recursive, interval=args.poll_interval or 2.0)
+    
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    files = queue.Queue(maxsize=args.watch_queue)
+    state = WatchState()
+    report = open_report(args)
+    output_lock = threading.Lock()
+    _install_output_capture()
+    
+    def worker():
+        while True:
+            path = files.get()
+            if path is None:
+                return
+            buffer = io.StringIO()
+            record = error = None
+            size_before = size_before_removal(path, args) if report else None
+            with capture_output(buffer):
+                try:
+                    record = process_file(processor, path, args)
+                except Exception as e:
+                    error = report_failure(path, e)
+            if report:
+                report.add(path, record, error, size_before)
+            state.release(path)
+            with output_lock:
+                sys.stdout.write(buffer.getvalue())
+                sys.stdout.flush()
+                if writer:
+                    writer.write(path, record, error)
     
-    # Filter supported files
-    supported_files = [f for f in file_paths if processor.is_supported_format(f)]
-    unsupported_files = [f for f in file_paths if not processor.is_supported_format(f)]
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
     
-    if unsupported_files:
-        print(f"Warning: Skipping {len(unsupported_files)} unsupported files:")
-        for f in unsupported_files:
-            print(f"  {f}")
+    print(f"Watching {root} with {jobs} worker(s) ({type(watcher).__name__}), press Ctrl+C to stop")
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    try:
+        for path in settled_files(watcher, args.settle):
+            name = os.path.basename(path)
+            if os.path.splitext(name)[1].lower() not in processor.supported_formats:
+                continue
+            if args.include and not _matches_any(name, path, args.include):
+                continue
+            if _matches_any(name, path, args.exclude):
+                continue
+            if state.claim(path):
+                files.put(path)  # Blocks when the queue is full, holding back the watcher
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        for _ in threads:
+            files.put(None)
+        for thread in threads:
+            thread.join()
+    return finish_report(report, args)
+
+
+def run_stdin(processor: ExifMetadataProcessor, args: argparse.Namespace,
+              writer: Optional['RecordWriter'] = None) -> int:
+    """Scan one image piped to standard input, without touching the filesystem"""
+    if args.files != ['-']:
+        print("Error: '-' (standard input) cannot be combined with other files.")
+        return 1
+    if args.remove or args.remove_ai_only or args.save_metadata:
+        print("Error: --remove, --remove-ai-only and --save-metadata need a file, not standard input.")
+        return 1
     
-    if not supported_files:
-        print("No supported image files found.")
+    data = sys.stdin.buffer.read()
+    if not processor.is_supported_format(data):
+        print("No supported image data on standard input.")
         return 1
     
-    print(f"Processing {len(supported_files)} image file(s)...")
+    report = open_report(args)
+    record = error = None
+    try:
+        record = process_file(processor, STDIN_NAME, args, source=data)
+        if writer:
+            writer.write(STDIN_NAME, record)
+    except Exception as e:
+        error = report_failure(STDIN_NAME, e)
+        if writer:
+            writer.write(STDIN_NAME, None, error)
+    if report:
+        report.add(STDIN_NAME, record, error, image_format=sniff_image_format(data[:8]))
+    return finish_report(report, args)
+
+
+def run(args: argparse.Namespace, writer: Optional['RecordWriter'] = None) -> int:
+    """Process the files selected by parsed command line arguments"""
+    processor = ExifMetadataProcessor(**processor_options(args))
+    
+    if args.watch:
+        return watch(processor, args, writer)
+    
+    if '-' in args.files:
+        return run_stdin(processor, args, writer)
+    
+    if args.recursive:
+        if args.copy:
+            print("Error: --copy option can only be used with a single file.")
+            return 1
+        
+        # Stream files straight into processing instead of building the full list
+        supported_files = timed_iter(walk_image_files(args.files, processor.supported_formats, args.include,
+                                                      args.exclude, args.follow_symlinks), 'walk')
+        first = next(supported_files, None)
+        if first is None:
+            print("No supported image files found.")
+            return 1
+        supported_files = itertools.chain([first], supported_files)
+        print("Processing image files recursively...")
+    else:
+        # Expand file patterns
+        with timed('glob'):
+            file_paths = expand_file_patterns(args.files)
+        
+        if not file_paths:
+            print("No files found matching the specified patterns.")
+            return 1
+        
+        # Check if copy option is used with multiple files
+        if args.copy and len(file_paths) > 1:
+            print("Error: --copy option can only be used with a single file.")
+            return 1
+        
+        # Filter supported files
+        supported_files = []
+        unsupported_files = []
+        for f in file_paths:
+            (supported_files if processor.is_supported_format(f) else unsupported_files).append(f)
+        
+        if unsupported_files:
+            print(f"Warning: Skipping {len(unsupported_files)} unsupported files:")
+            for f in unsupported_files:
+                print(f"  {f}")
+        
+        if not supported_files:
+            print("No supported image files found.")
+            return 1
+        
+        print(f"Processing {len(supported_files)} image file(s)...")
+    
+    cache = open_cache(args)
+    details = not args.skip_makernotes
+    
+    dedupe = None
+    if args.dedupe:
+        dedupe = DuplicateIndex(args.dedupe, processor.max_metadata_bytes)
+    digests = collections.deque()  # Digest of each yielded item, in order, until its result is in
+    report = open_report(args)
+    sizes = {}  # Size before --remove of each yielded item, until its result is in
+    uncached = set()  # Yielded items with no cached record, which are stored once read
+    
+    def with_cached(filepaths):
+        for filepath in filepaths:
+            if report:
+                sizes[filepath] = size_before_removal(filepath, args)
+            cached = duplicate_of = None
+            if cache is not None:
+                with timed('cache'):
+                    cached = cache.get(filepath, details)
+            if dedupe is not None:
+                with timed('hash'):
+                    digest, duplicate_of, record = dedupe.check(filepath)
+                digests.append(digest)
+                cached = cached or record
+            if cache is not None and cached is None:
+                uncached.add(filepath)
+            yield filepath, cached, duplicate_of
+    
+    def finished(filepath: str, record: Optional[ScanRecord], error: Optional[str] = None):
+        uncached.discard(filepath)
+        if dedupe is not None:
+            dedupe.put(digests.popleft(), record)
+        if report:
+            report.add(filepath, record, error, sizes.pop(filepath, None))
+    
+    try:
+        if args.jobs != 1 and (args.recursive or len(supported_files) > 1):
+            # Parallel run: output is buffered per file and printed in input order
+            errors = []
+            for filepath, output, error, record, stats in run_parallel(with_cached(supported_files), args):
+                fresh = filepath in uncached
+                finished(filepath, record, error)
+                if stats:
+                    STATS.merge(stats)
+                if output:
+                    sys.stdout.write(output)
+                if error and not error.startswith(SKIPPED_PREFIX):
+                    errors.append((filepath, error))
+                    if STATS is not None:
+                        STATS.count_verdict('error')
+                elif fresh and record is not None:
+                    with timed('cache'):
+                        cache.put(filepath, record, details)
+                if writer:
+                    writer.write(filepath, record, error)
+            
+            if errors:
+                print(f"\n✗ {len(errors)} file(s) failed:")
+                for filepath, error in errors:
+                    print(f"  {filepath}: {error}")
+        else:
+            for filepath, cached, duplicate_of in with_cached(supported_files):
+                record = error = None
+                try:
+                    record = process_file(processor, filepath, args, cached, duplicate_of=duplicate_of)
+                    if cache and cached is None:
+                        with timed('cache'):
+                            cache.put(filepath, record, details)
+                    if writer:
+                        writer.write(filepath, record)
+                except Exception as e:
+                    error = report_failure(filepath, e)
+                    if writer:
+                        writer.write(filepath, None, error)
+                finished(filepath, record, error)
+        
+        if dedupe is not None:
+            dedupe.print_summary(args.verbose)
+            if args.dedupe_report:
+                dedupe.write_report(args.dedupe_report)
+                print(f"💾 Saved duplicate report: {args.dedupe_report}")
+    finally:
+        if cache:
+            if args.verbose:
+                print(f"Cache: {cache.hits} hit(s), {cache.misses} miss(es) [{cache.path}]")
+            cache.close()
+    
+    return finish_report(report, args)
+
+
+def write_stats(stats: RunStats, args: argparse.Namespace):
+    """Print the --profile table and/or write the --stats file"""
+    if args.profile:
+        # Keep record output on stdout clean
+        stats.print_summary(file=sys.stdout if args.format == 'text' else sys.stderr)
+    if args.stats:
+        import json
+        try:
+            with open(args.stats, 'w', encoding='utf-8') as f:
+                json.dump(stats.to_dict(), f, indent=2)
+        except OSError as e:
+            print(f"Warning: Could not write stats to {args.stats}: {e}", file=sys.stderr)
+
+
+def run_with_output(args: argparse.Namespace) -> int:
+    """Run with the record writer selected by --format / --output"""
+    if args.format == 'text':
+        return run(args)
+    
+    if args.output and args.output != '-':
+        with open(args.output, 'w', encoding='utf-8', newline='') as stream:
+            return run(args, RecordWriter(stream, args.format))
+    
+    # Records own stdout; progress messages and warnings go to stderr
+    writer = RecordWriter(sys.stdout, args.format)
+    with contextlib.redirect_stdout(sys.stderr):
+        return run(args, writer)
+
+
+def main():
+    global STATS
+    parser = build_parser()
+    args = parser.parse_args()
     
-    for filepath in supported_files:
+    if args.serve:
+        return serve(args)
+    if args.batch_from:
+        if args.batch_from == '-' and '-' in args.files:
+            parser.error("--batch-from - and '-' both read standard input")
         try:
-            # Read EXIF data
-            exif_data = processor.read_exif_data(filepath)
-            ai_metadata = processor.find_ai_generation_metadata(exif_data)
-            
-            if args.remove:
-                # Remove metadata
-                success = processor.remove_ai_metadata(filepath)
-                if args.verbose and success:
-                    print(f"Removed {len(exif_data)} EXIF tags from {filepath}")
-            elif args.copy:
-                # Copy metadata to clipboard
-                processor.copy_ai_metadata_to_clipboard(ai_metadata)
-            elif args.save_metadata:
-                # Save metadata to file
-                processor.save_ai_metadata_to_file(filepath, ai_metadata)
-            else:
-                # Display metadata
-                if args.ai_only:
-                    if ai_metadata:
-                        print(f"\n🤖 AI Generation Metadata in {filepath}:")
-                        for tag, value in ai_metadata.items():
-                            print(f"  {tag}: {value}")
-                    elif args.verbose:
-                        print(f"\n{filepath}: No AI generation metadata detected")
-                else:
-                    processor.display_metadata(filepath, exif_data, ai_metadata)
-                    
-        except Exception as e:
-            print(f"Error processing {filepath}: {e}")
+            args.files = args.files + read_batch_paths(args.batch_from)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error: Cannot read path list {args.batch_from}: {e}")
+            return 1
+        if not args.files:
+            print(f"No paths listed in {args.batch_from}.")
+            return 1
+    if not args.files and not args.watch:
+        parser.error("the following arguments are required: files")
     
-    return 0
+    if not (args.profile or args.stats):
+        return run_with_output(args)
+    
+    STATS = RunStats(slowest=args.slowest)
+    try:
+        with timed('total'):
+            return run_with_output(args)
+    finally:
+        write_stats(STATS, args)
 
 
 if __name__ == "__main__":
+    # Needed for process pools in frozen (PyInstaller) Windows builds
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+PromptSniffer throughput benchmarks.
+
+Runs the read, detect, save and strip stages over a corpus (see corpus.py) and reports
+files/sec, MB/s and peak RSS per stage. Each stage runs in a fresh process so peak RSS
+belongs to that stage alone. Results can be saved as a baseline and later runs compared
+against it; a regression beyond --tolerance makes the run exit non-zero.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+STAGES = ['read', 'detect', 'save', 'strip']
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # bytes vs KB
+
+
+def run_stage(stage: str, paths: List[str]) -> Dict[str, Any]:
+    """Time one stage over paths; runs in a child process"""
+    import PromptSniffer
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    with tempfile.TemporaryDirectory(prefix='promptsniffer-bench-') as workdir:
+        if stage in ('save', 'strip'):
+            # Both stages write next to the image, so work on copies (not timed)
+            copies = []
+            for path in paths:
+                copy = os.path.join(workdir, os.path.basename(path))
+                shutil.copyfile(path, copy)
+                copies.append(copy)
+            paths = copies
+        total_bytes = sum(os.path.getsize(p) for p in paths)
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for path in paths:
+                if stage == 'strip':
+                    processor.remove_ai_metadata(path)
+                    continue
+                exif_data = processor.read_exif_data(path)
+                if stage == 'read':
+                    continue
+                ai_metadata = processor.find_ai_generation_metadata(exif_data)
+                if stage == 'save':
+                    processor.save_ai_metadata_to_file(path, ai_metadata)
+            elapsed = time.perf_counter() - start
+
+    return {
+        'files': len(paths),
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'files_per_sec': len(paths) / elapsed if elapsed else 0.0,
+        'mb_per_sec': total_bytes / 1e6 / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def benchmark(paths: List[str], stages: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Run each stage repeat times in fresh processes and keep the fastest run"""
+    context = multiprocessing.get_context('spawn')  # Fork would inherit the parent's RSS
+    results = {}
+    for stage in stages:
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(run_stage, (stage, paths)))
+        best = max(runs, key=lambda r: r['files_per_sec'])
+        best['peak_rss_mb'] = max((r['peak_rss_mb'] or 0.0) for r in runs) or None
+        results[stage] = best
+    return results
+
+
+def environment() -> Dict[str, str]:
+    import PIL
+    import exifread
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pillow': PIL.__version__,
+        'exifread': getattr(exifread, '__version__', 'unknown'),
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    header = f"{'stage':<8} {'files':>6} {'files/s':>10} {'MB/s':>9} {'peak RSS':>10}"
+    if baseline:
+        header += f" {'vs baseline':>12}"
+    print(header)
+    print("-" * len(header))
+    for stage, r in results.items():
+        rss = f"{r['peak_rss_mb']:.1f} MB" if r['peak_rss_mb'] is not None else "n/a"
+        line = f"{stage:<8} {r['files']:>6} {r['files_per_sec']:>10.1f} {r['mb_per_sec']:>9.1f} {rss:>10}"
+        base = (baseline or {}).get(stage)
+        if base and base.get('files_per_sec'):
+            change = r['files_per_sec'] / base['files_per_sec'] - 1
+            line += f" {change:>+11.1%}"
+        print(line)
+
+
+def regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages whose throughput fell more than tolerance below the baseline"""
+    slow = []
+    for stage, r in results.items():
+        base = baseline.get(stage)
+        if base and r['files_per_sec'] < base['files_per_sec'] * (1 - tolerance):
+            slow.append(stage)
+    return slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PromptSniffer read/detect/save/strip throughput")
+    parser.add_argument('corpus', help='Directory of images, e.g. generated by benchmarks/corpus.py')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='Stages to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per stage; the fastest is reported (default: 3)')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help='Store results as the baseline (default: benchmarks/baseline.json)')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help='Compare against a stored baseline (default: benchmarks/baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed files/sec drop before --compare fails (default: 0.10)')
+    args = parser.parse_args()
+
+    extensions = {'.jpg', '.jpeg', '.tiff', '.tif', '.png'}
+    paths = sorted(p for p in glob.glob(os.path.join(args.corpus, '*'))
+                   if os.path.splitext(p)[1].lower() in extensions and os.path.isfile(p))
+    if not paths:
+        print(f"Error: No images in {args.corpus} (generate some with benchmarks/corpus.py)")
+        return 1
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Cannot read baseline {args.compare}: {e}")
+            return 1
+        if baseline.get('environment') != environment():
+            print("Warning: Baseline was recorded in a different environment, numbers may not be comparable")
+
+    print(f"Benchmarking {len(paths)} files, best of {args.repeat}...\n")
+    results = benchmark(paths, args.stages, args.repeat)
+    print_results(results, baseline and baseline.get('stages'))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'stages': results}, f, indent=2)
+        print(f"\n💾 Saved baseline: {args.save_baseline}")
+
+    if baseline:
+        slow = regressions(results, baseline.get('stages', {}), args.tolerance)
+        if slow:
+            print(f"\n✗ Throughput regressed more than {args.tolerance:.0%} in: {', '.join(slow)}")
+            return 1
+        print(f"\n✓ No stage regressed more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Synthetic benchmark corpus generator for PromptSniffer.
+
+Writes PNGs carrying tEXt/iTXt/zTXt chunks of varying sizes (including large ComfyUI
+workflows) and JPEG/TIFF files with EXIF and MakerNotes at several resolutions.
+Output is deterministic for a given seed, so timings are comparable between runs.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, List
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+DEFAULT_SIZES = [512, 1024, 2048]
+JPEG_MAX_MAKERNOTE_KB = 48  # EXIF has to fit in a single 64 KB APP1 segment
+
+A1111_PARAMETERS = (
+    "a lighthouse on a cliff at dusk, dramatic clouds, highly detailed\n"
+    "Negative prompt: blurry, lowres, watermark\n"
+    "Steps: 30, Sampler: DPM++ 2M Karras, CFG scale: 7, Seed: {seed}, Size: {size}x{size}, "
+    "Model hash: 6ce0161689, Model: v1-5-pruned-emaonly"
+)
+
+
+def comfyui_workflow(rng: random.Random, nodes: int) -> Dict[str, object]:
+    """Build a ComfyUI-style workflow graph with the given number of nodes"""
+    return {
+        "last_node_id": nodes,
+        "last_link_id": nodes - 1,
+        "nodes": [
+            {
+                "id": i,
+                "type": rng.choice(["KSampler", "CLIPTextEncode", "VAEDecode", "CheckpointLoaderSimple"]),
+                "pos": [rng.randint(0, 4000), rng.randint(0, 4000)],
+                "size": {"0": 315, "1": 262},
+                "inputs": [{"name": "model", "type": "MODEL", "link": i - 1}] if i else [],
+                "outputs": [{"name": "LATENT", "type": "LATENT", "links": [i]}],
+                "widgets_values": [rng.randint(0, 2**32), "randomize", 20, 8, "euler", "normal", 1],
+            }
+            for i in range(nodes)
+        ],
+        "links": [[i, i, 0, i + 1, 0, "MODEL"] for i in range(nodes - 1)],
+        "version": 0.4,
+    }
+
+
+def comfyui_prompt(rng: random.Random, nodes: int) -> Dict[str, object]:
+    """Build the ComfyUI API-format prompt that accompanies a workflow"""
+    return {
+        str(i): {
+            "class_type": "KSampler",
+            "inputs": {"seed": rng.randint(0, 2**32), "steps": 20, "cfg": 8.0,
+                       "sampler_name": "euler", "scheduler": "normal", "denoise": 1.0},
+        }
+        for i in range(nodes)
+    }
+
+
+def random_bytes(rng: random.Random, n: int) -> bytes:
+    """rng.randbytes(n) for Pythons before 3.9, drawing the same bytes"""
+    return rng.getrandbits(n * 8).to_bytes(n, 'little')
+
+
+def noise_image(rng: random.Random, size: int) -> Image.Image:
+    """Low-entropy noise so encoders do real work without the corpus ballooning"""
+    tile = Image.frombytes('RGB', (64, 64), random_bytes(rng, 64 * 64 * 3))
+    return tile.resize((size, size), Image.Resampling.BILINEAR)
+
+
+def exif_block(rng: random.Random, seed: int, size: int, makernote_kb: int) -> Image.Exif:
+    """EXIF with generation parameters in ImageDescription/UserComment plus a MakerNote"""
+    exif = Image.Exif()
+    exif[0x010F] = "BenchCam"                      # Make
+    exif[0x0110] = "Synthetic 1"                   # Model
+    exif[0x0131] = "ComfyUI"                       # Software
+    exif[0x010E] = A1111_PARAMETERS.format(seed=seed, size=size)
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x9286] = b"ASCII\0\0\0" + A1111_PARAMETERS.format(seed=seed, size=size).encode()
+    exif_ifd[0x927C] = random_bytes(rng, makernote_kb * 1024)
+    return exif
+
+
+def write_png(path: str, rng: random.Random, size: int, nodes: int, seed: int):
+    info = PngInfo()
+    info.add_text("parameters", A1111_PARAMETERS.format(seed=seed, size=size))
+    info.add_text("prompt", json.dumps(comfyui_prompt(rng, max(1, nodes // 4))), zip=True)  # zTXt
+    info.add_itxt("workflow", json.dumps(comfyui_workflow(rng, nodes)), zip=nodes > 100)
+    info.add_text("Software", "ComfyUI")
+    noise_image(rng, size).save(path, pnginfo=info)
+
+
+def write_jpeg(path: str, rng: random.Random, size: int, makernote_kb: int, seed: int):
+    noise_image(rng, size).save(path, quality=90, exif=exif_block(rng, seed, size, makernote_kb))
+
+
+def write_tiff(path: str, rng: random.Random, size: int, makernote_kb: int, seed: int):
+    noise_image(rng, size).save(path, exif=exif_block(rng, seed, size, makernote_kb))
+
+
+def generate(output_dir: str, count: int = 4, sizes: List[int] = DEFAULT_SIZES, seed: int = 0) -> List[str]:
+    """Write count files per format and resolution into output_dir and return their paths"""
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+
+    for size in sizes:
+        for i in range(count):
+            image_seed = rng.randint(0, 2**32)
+            # Cycle metadata sizes: small A1111-only text up to multi-megabyte workflows
+            nodes = [4, 40, 400, 4000][i % 4]
+            makernote_kb = [1, 16, 64, 256][i % 4]
+
+            png = os.path.join(output_dir, f"png_{size}_{i:03d}.png")
+            write_png(png, rng, size, nodes, image_seed)
+            jpg = os.path.join(output_dir, f"jpeg_{size}_{i:03d}.jpg")
+            write_jpeg(jpg, rng, size, min(makernote_kb, JPEG_MAX_MAKERNOTE_KB), image_seed)
+            tif = os.path.join(output_dir, f"tiff_{size}_{i:03d}.tif")
+            write_tiff(tif, rng, size, makernote_kb, image_seed)
+            paths.extend([png, jpg, tif])
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PromptSniffer benchmark corpus")
+    parser.add_argument('output_dir', help='Directory to write the corpus into')
+    parser.add_argument('-n', '--count', type=int, default=4,
+                        help='Files per format and resolution (default: 4)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='PX',
+                        help='Square image resolutions to generate (default: 512 1024 2048)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    paths = generate(args.output_dir, args.count, args.sizes, args.seed)
+    total = sum(os.path.getsize(p) for p in paths)
+    print(f"✓ Wrote {len(paths)} files ({total / 1e6:.1f} MB) to {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
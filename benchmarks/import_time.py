@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+PromptSniffer cold-start benchmark.
+
+Times fresh interpreter runs of the entry points a context-menu click goes through
+(import, --help, --ai-only on a PNG and on a JPEG) and checks which modules each run
+loaded. A heavy module showing up where it is not needed (e.g. exifread for a PNG)
+fails the run outright; wall times can be saved as a baseline and compared like
+bench.py does.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'import_baseline.json')
+
+# Modules that only specific features need; none of them may load on these paths
+LAZY_MODULES = ['PIL', 'exifread', 'subprocess', 'tempfile', 'http.server', 'socketserver',
+                'concurrent.futures', 'multiprocessing', 'sqlite3', 'asyncio', 'pathlib']
+
+# Runs in the child: report loaded modules on exit, before anything else gets imported
+CHILD = """
+import atexit, sys
+atexit.register(lambda: sys.stderr.write('\\nMODULES ' + ' '.join(sorted(sys.modules)) + '\\n'))
+sys.argv = ['PromptSniffer'] + sys.argv[1:]
+import PromptSniffer
+if len(sys.argv) > 1:
+    sys.exit(PromptSniffer.main())
+"""
+
+
+def scenarios(png: str, jpeg: str) -> Dict[str, Dict[str, Any]]:
+    """Entry points to time, with the modules each must not load"""
+    return {
+        'import': {'argv': [], 'lazy': LAZY_MODULES},
+        'help': {'argv': ['--help'], 'lazy': LAZY_MODULES},
+        'png-ai-only': {'argv': ['--ai-only', png], 'lazy': LAZY_MODULES},
+        'jpeg-ai-only': {'argv': ['--ai-only', jpeg],
+                         'lazy': [m for m in LAZY_MODULES if m not in ('PIL', 'exifread')]},
+    }
+
+
+def write_samples(directory: str) -> List[str]:
+    """A small A1111 PNG (text chunks only) and JPEG (EXIF) to run the scenarios on"""
+    import random
+    from corpus import write_jpeg, write_png
+
+    rng = random.Random(0)
+    png = os.path.join(directory, 'sample.png')
+    jpeg = os.path.join(directory, 'sample.jpg')
+    write_png(png, rng, 64, 4, 1)
+    write_jpeg(jpeg, rng, 64, 1, 1)
+    return [png, jpeg]
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # Time cached bytecode, as an installed copy would run
+    return env
+
+
+def run_once(argv: List[str], env: Dict[str, str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', CHILD] + argv, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('MODULES '):
+            modules = set(line.split()[1:])
+    return {'seconds': elapsed, 'modules': modules, 'returncode': proc.returncode}
+
+
+def loaded(modules: set, names: List[str]) -> List[str]:
+    """Which of names (or their submodules) appear in modules"""
+    return [name for name in names if any(m == name or m.startswith(name + '.') for m in modules)]
+
+
+def benchmark(cases: Dict[str, Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    env = child_env()
+    run_once([], env)  # Warm the bytecode cache and the OS file cache
+    results = {}
+    for name, case in [('python', {'argv': None, 'lazy': []})] + list(cases.items()):
+        runs = []
+        for _ in range(repeat):
+            if case['argv'] is None:
+                start = time.perf_counter()
+                subprocess.run([sys.executable, '-c', 'pass'], env=env)
+                runs.append({'seconds': time.perf_counter() - start, 'modules': set(), 'returncode': 0})
+            else:
+                runs.append(run_once(case['argv'], env))
+        results[name] = {
+            'ms': statistics.median(r['seconds'] for r in runs) * 1000,
+            'unexpected': loaded(runs[-1]['modules'], case['lazy']),
+            'returncode': runs[-1]['returncode'],
+        }
+    return results
+
+
+def environment() -> Dict[str, str]:
+    return {'python': platform.python_version(), 'platform': platform.platform()}
+
+
+def print_results(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None):
+    header = f"{'entry point':<14} {'median':>10}"
+    if baseline:
+        header += f" {'vs baseline':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = f"{name:<14} {r['ms']:>7.1f} ms"
+        base = (baseline or {}).get(name)
+        if base and base.get('ms'):
+            line += f" {r['ms'] / base['ms'] - 1:>+11.1%}"
+        if r['unexpected']:
+            line += f"  loaded: {', '.join(r['unexpected'])}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PromptSniffer cold-start time and lazy imports")
+    parser.add_argument('--repeat', type=int, default=15,
+                        help='Runs per entry point; the median is reported (default: 15)')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help='Store results as the baseline (default: benchmarks/import_baseline.json)')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='FILE',
+                        help='Compare against a stored baseline (default: benchmarks/import_baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='Allowed slowdown before --compare fails (default: 0.20)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Cannot read baseline {args.compare}: {e}")
+            return 1
+        if baseline.get('environment') != environment():
+            print("Warning: Baseline was recorded in a different environment, numbers may not be comparable")
+
+    with tempfile.TemporaryDirectory(prefix='promptsniffer-import-') as workdir:
+        png, jpeg = write_samples(workdir)
+        print(f"Timing cold starts, median of {args.repeat}...\n")
+        results = benchmark(scenarios(png, jpeg), args.repeat)
+    print_results(results, baseline and baseline.get('entry_points'))
+
+    status = 0
+    failed = [name for name, r in results.items() if r['returncode'] != 0]
+    if failed:
+        print(f"\n✗ Non-zero exit from: {', '.join(failed)}")
+        status = 1
+    eager = [name for name, r in results.items() if r['unexpected']]
+    if eager:
+        print(f"\n✗ Modules loaded that should be imported on demand: {', '.join(eager)}")
+        status = 1
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(),
+                       'entry_points': {name: {'ms': r['ms']} for name, r in results.items()}}, f, indent=2)
+        print(f"\n💾 Saved baseline: {args.save_baseline}")
+
+    if baseline:
+        slow = [name for name, r in results.items()
+                if name != 'python' and name in baseline.get('entry_points', {})
+                and r['ms'] > baseline['entry_points'][name]['ms'] * (1 + args.tolerance)]
+        if slow:
+            print(f"\n✗ Startup regressed more than {args.tolerance:.0%} in: {', '.join(slow)}")
+            return 1
+        if not status:
+            print(f"\n✓ No entry point regressed more than {args.tolerance:.0%}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Shared setup and synthetic image builders for the test suite"""
+
+import io
+import os
+import struct
+import sys
+import zlib
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PromptSniffer  # noqa: E402
+
+
+def png_bytes(text=None, color='blue', chunks=(), **save_options):
+    """An 8x8 PNG with a tEXt chunk per text entry and (type, data) chunks after IHDR"""
+    info = PngInfo()
+    for key, value in (text or {}).items():
+        info.add_text(key, value)
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG', pnginfo=info, **save_options)
+    data = buffer.getvalue()
+    ihdr_end = len(PromptSniffer.PNG_SIGNATURE) + 8 + 13 + 4
+    extra = b''.join(struct.pack('>I4s', len(chunk), chunk_type) + chunk
+                     + struct.pack('>I', zlib.crc32(chunk_type + chunk)) for chunk_type, chunk in chunks)
+    return data[:ihdr_end] + extra + data[ihdr_end:]
+
+
+def write_png(path, text=None, **options):
+    """Write png_bytes() to path and return it as a string"""
+    with open(path, 'wb') as f:
+        f.write(png_bytes(text, **options))
+    return str(path)
+
+
+def png_header_bytes(width, height):
+    """A greyscale PNG declaring width x height pixels but carrying no pixel data"""
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return (PromptSniffer.PNG_SIGNATURE + chunk(b'IHDR', ihdr)
+            + chunk(b'IDAT', zlib.compress(b'')) + chunk(b'IEND', b''))
+
+
+def jpeg_bytes(segments=(), **save_options):
+    """A decodable 8x8 JPEG with (marker, payload) APP segments inserted after SOI"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'JPEG', **save_options)
+    plain = buffer.getvalue()
+    extra = b''.join(struct.pack('>BBH', 0xFF, marker, len(payload) + 2) + payload for marker, payload in segments)
+    return plain[:2] + extra + plain[2:]
+
+
+def jpeg_with_app1(payload):
+    """A JPEG whose only APP1 segment carries payload as EXIF"""
+    return jpeg_bytes([(PromptSniffer.JPEG_APP1, PromptSniffer.EXIF_HEADER + payload)])
+
+
+def tiff_block(entries, extra=b''):
+    """Little-endian TIFF structure with one IFD; entries are (tag, type, count, value or offset)"""
+    ifd = struct.pack('<H', len(entries))
+    for tag, field_type, count, value in entries:
+        ifd += struct.pack('<HHI', tag, field_type, count)
+        ifd += value.ljust(4, b'\0') if isinstance(value, bytes) else struct.pack('<I', value)
+    return b'II*\0' + struct.pack('<I', 8) + ifd + struct.pack('<I', 0) + extra
+
+
+def value_offset(entry_count):
+    """Offset of the first byte after a single IFD with entry_count entries"""
+    return 8 + 2 + 12 * entry_count + 4
+
+
+def c2pa_manifest(source_type='trainedAlgorithmicMedia'):
+    """A stand-in C2PA JUMBF payload declaring an IPTC digital source type"""
+    return (b'JP\0\x01jumb\0\0\0\x1ejumdc2pa' + b'claim_generator' + bytes([0x60 + 7]) + b'GenTool'
+            + b'http://cv.iptc.org/newscodes/digitalsourcetype/' + source_type.encode())
@@ -0,0 +1,67 @@
+"""C2PA Content Credentials: detection and removal"""
+
+import pytest
+
+import PromptSniffer
+from conftest import c2pa_manifest, jpeg_bytes, png_bytes, tiff_block, value_offset
+
+SOFTWARE = 0x0131
+
+
+def sample(image_format):
+    if image_format == 'png':
+        return png_bytes({'parameters': 'a lighthouse, Steps: 20'}, chunks=[(b'caBX', c2pa_manifest())])
+    return jpeg_bytes([(PromptSniffer.JPEG_APP11, c2pa_manifest())])
+
+
+def scan(path):
+    return PromptSniffer.scan(str(path))
+
+
+@pytest.mark.parametrize('image_format', ['png', 'jpeg'])
+def test_remove_strips_c2pa(tmp_path, image_format):
+    path = tmp_path / f'render.{image_format}'
+    path.write_bytes(sample(image_format))
+    assert scan(path).ai_generated
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    assert processor.remove_ai_metadata(str(path))
+    assert b'c2pa' not in path.read_bytes()
+    assert not scan(path).ai_generated
+
+
+@pytest.mark.parametrize('image_format', ['png', 'jpeg'])
+def test_remove_ai_only_strips_c2pa(tmp_path, image_format):
+    path = tmp_path / f'render.{image_format}'
+    path.write_bytes(sample(image_format))
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    assert processor.remove_ai_tags(str(path), scan(path).ai_metadata)
+    assert b'c2pa' not in path.read_bytes()
+    assert not scan(path).ai_generated
+
+
+def test_remove_ai_only_patches_exif_while_dropping_c2pa(tmp_path):
+    text = b'ComfyUI generated image\0'
+    exif = PromptSniffer.EXIF_HEADER + tiff_block([(SOFTWARE, 2, len(text), value_offset(1))], text)
+    # The manifest comes first, so the EXIF block moves when it is dropped
+    data = jpeg_bytes([(PromptSniffer.JPEG_APP11, c2pa_manifest()), (PromptSniffer.JPEG_APP1, exif)])
+    path = tmp_path / 'both.jpg'
+    path.write_bytes(data)
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    assert processor.remove_ai_tags(str(path), {'Software': 'ComfyUI', PromptSniffer.C2PA_KEY: 'x'})
+    cleaned = path.read_bytes()
+    assert text not in cleaned and b'c2pa' not in cleaned
+    assert not scan(path).ai_generated
+
+
+def test_remove_ai_only_reports_failure_when_nothing_was_removable(tmp_path):
+    path = tmp_path / 'plain.png'
+    data = png_bytes({'Comment': 'holiday'})
+    path.write_bytes(data)
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup_dir=str(tmp_path / 'backups'))
+    assert not processor.remove_ai_tags(str(path), {PromptSniffer.C2PA_KEY: 'x'})
+    assert path.read_bytes() == data
+    assert not (tmp_path / 'backups').exists()
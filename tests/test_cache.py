@@ -0,0 +1,45 @@
+"""Metadata cache round trips and write-back"""
+
+import os
+import sys
+
+import PromptSniffer
+from conftest import write_png
+
+
+def test_get_remembers_file_key_only_on_miss(tmp_path):
+    image = write_png(tmp_path / 'a.png', {'parameters': 'a lighthouse, Steps: 20'})
+    cache = PromptSniffer.MetadataCache(str(tmp_path / 'cache.db'))
+    processor = PromptSniffer.ExifMetadataProcessor()
+
+    assert cache.get(image) is None
+    assert os.path.abspath(image) in cache._pending_keys
+    exif_data = processor.read_metadata(image)
+    cache.put(image, (exif_data, {}, {}))
+    assert not cache._pending_keys
+
+    assert cache.get(image) is not None
+    assert not cache._pending_keys
+    cache.close()
+
+
+def test_runs_store_only_cache_misses(tmp_path, monkeypatch, capsys):
+    images = [write_png(tmp_path / f'{i}.png', {'parameters': f'prompt {i}, Steps: 20'}) for i in range(4)]
+    puts = []
+    original_put = PromptSniffer.MetadataCache.put
+    monkeypatch.setattr(PromptSniffer.MetadataCache, 'put',
+                        lambda self, filepath, *rest: puts.append(filepath) or original_put(self, filepath, *rest))
+
+    def run(jobs):
+        del puts[:]
+        monkeypatch.setattr(sys, 'argv', ['PromptSniffer', '--cache', str(tmp_path / 'cache.db'),
+                                          '-j', jobs, '--ai-only'] + images)
+        PromptSniffer.main()
+        return list(puts)
+
+    assert sorted(run('2')) == sorted(images)
+    assert run('2') == []
+    assert run('1') == []
+
+    os.utime(images[0], ns=(0, 0))
+    assert run('2') == [images[0]]
@@ -0,0 +1,151 @@
+"""Regression tests for the lossless container rewriters"""
+
+import io
+import os
+import struct
+
+import pytest
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+import PromptSniffer
+from conftest import jpeg_with_app1, tiff_block, value_offset
+
+SOFTWARE = 0x0131
+ARTIST = 0x013B
+
+
+def segments(data):
+    return [(marker, length) for marker, _offset, length in PromptSniffer.iter_jpeg_segments(io.BytesIO(data))]
+
+
+def test_filter_ifd_tags_wipes_value_in_place():
+    text = b'ComfyUI generated image\0'
+    block = bytearray(tiff_block([(SOFTWARE, 2, len(text), value_offset(2)),
+                                  (ARTIST, 2, 4, b'me\0')], text))
+    size = len(block)
+
+    assert PromptSniffer.filter_ifd_tags(block, {SOFTWARE}) == 1
+    assert len(block) == size
+    assert text not in block
+    assert struct.unpack('<H', block[8:10])[0] == 1
+    assert struct.unpack('<H', block[10:12])[0] == ARTIST
+
+
+def test_filter_ifd_tags_rejects_value_past_end():
+    # 40-byte Software value with only 28 bytes left in the block
+    block = bytearray(tiff_block([(SOFTWARE, 2, 40, value_offset(1))], b'x' * 28))
+    original = bytes(block)
+
+    with pytest.raises(ValueError):
+        PromptSniffer.filter_ifd_tags(block, {SOFTWARE})
+    assert block == original
+
+
+def test_filter_ifd_tags_rejects_table_past_end():
+    block = bytearray(b'II*\0' + struct.pack('<I', 8) + struct.pack('<H', 50) + b'\0' * 12)
+    original = bytes(block)
+
+    with pytest.raises(ValueError):
+        PromptSniffer.filter_ifd_tags(block, {SOFTWARE})
+    assert block == original
+
+
+def test_remove_ai_tags_leaves_jpeg_intact_on_overflowing_value(tmp_path):
+    data = jpeg_with_app1(tiff_block([(SOFTWARE, 2, 40, value_offset(1))], b'x' * 28))
+    path = tmp_path / 'overflow.jpg'
+    path.write_bytes(data)
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    assert not processor.remove_ai_tags(str(path), {'Software': 'ComfyUI'})
+    assert path.read_bytes() == data
+    with open(path, 'rb') as src:
+        PromptSniffer.strip_jpeg_segments(src, io.BytesIO())
+
+
+def test_remove_ai_tags_patches_jpeg_without_moving_segments(tmp_path):
+    text = b'ComfyUI generated image\0'
+    data = jpeg_with_app1(tiff_block([(SOFTWARE, 2, len(text), value_offset(1))], text))
+    path = tmp_path / 'patch.jpg'
+    path.write_bytes(data)
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup=False)
+    assert processor.remove_ai_tags(str(path), {'Software': 'ComfyUI'})
+    patched = path.read_bytes()
+    assert len(patched) == len(data)
+    assert text not in patched
+    assert segments(patched) == segments(data)
+    Image.open(path).load()
+
+
+def test_strip_png_chunks_drops_text_and_keeps_pixels():
+    info = PngInfo()
+    info.add_text('parameters', 'a lighthouse, Steps: 20')
+    info.add_text('prompt', '{"1": {}}', zip=True)
+    info.add_itxt('workflow', '{"nodes": []}')
+    source = io.BytesIO()
+    Image.new('RGB', (8, 8), 'blue').save(source, 'PNG', pnginfo=info)
+    data = source.getvalue()
+
+    output = io.BytesIO()
+    removed = PromptSniffer.strip_png_chunks(io.BytesIO(data), output)
+    stripped = output.getvalue()
+
+    assert removed == len(data) - len(stripped) > 0
+    assert b'parameters' not in stripped and b'workflow' not in stripped
+    with Image.open(io.BytesIO(stripped)) as img, Image.open(io.BytesIO(data)) as orig:
+        assert not img.text
+        assert img.tobytes() == orig.tobytes()
+
+
+def test_strip_jpeg_segments_drops_app1_and_keeps_scan_data():
+    text = b'ComfyUI generated image\0'
+    data = jpeg_with_app1(tiff_block([(SOFTWARE, 2, len(text), value_offset(1))], text))
+
+    output = io.BytesIO()
+    removed = PromptSniffer.strip_jpeg_segments(io.BytesIO(data), output)
+    stripped = output.getvalue()
+
+    assert removed == len(data) - len(stripped) > 0
+    assert PromptSniffer.JPEG_APP1 not in [marker for marker, _ in segments(stripped)]
+    assert data.endswith(stripped[-100:])
+    with Image.open(io.BytesIO(stripped)) as img, Image.open(io.BytesIO(data)) as orig:
+        assert img.tobytes() == orig.tobytes()
+
+
+def test_strip_jpeg_segments_rejects_truncated_file():
+    data = jpeg_with_app1(tiff_block([(ARTIST, 2, 4, b'me\0')]))
+    with pytest.raises(ValueError):
+        PromptSniffer.strip_jpeg_segments(io.BytesIO(data[:30]), io.BytesIO())
+
+
+@pytest.mark.parametrize('image_format', ['jpeg', 'tiff'])
+def test_remove_ai_tags_swaps_in_a_patched_copy(tmp_path, image_format):
+    text = b'ComfyUI generated image\0'
+    block = tiff_block([(SOFTWARE, 2, len(text), value_offset(1))], text)
+    data = jpeg_with_app1(block) if image_format == 'jpeg' else block
+    path = tmp_path / f'render.{image_format}'
+    path.write_bytes(data)
+    inode = os.stat(path).st_ino
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup_dir=str(tmp_path / 'backups'))
+    assert processor.remove_ai_tags(str(path), {'Software': 'ComfyUI'})
+
+    assert text not in path.read_bytes()
+    assert os.stat(path).st_ino != inode
+    backups = list((tmp_path / 'backups').rglob('*.backup'))
+    assert [b.read_bytes() for b in backups] == [data]
+    assert os.stat(backups[0]).st_ino == inode  # Kept by hardlink, not copied
+
+
+def test_remove_ai_tags_leaves_file_alone_when_nothing_matches(tmp_path):
+    data = jpeg_with_app1(tiff_block([(ARTIST, 2, 4, b'me\0')]))
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(data)
+    mtime = os.stat(path).st_mtime_ns
+
+    processor = PromptSniffer.ExifMetadataProcessor(backup_dir=str(tmp_path / 'backups'))
+    processor.remove_ai_tags(str(path), {'Software': 'ComfyUI'})
+
+    assert path.read_bytes() == data and os.stat(path).st_mtime_ns == mtime
+    assert not (tmp_path / 'backups').exists()
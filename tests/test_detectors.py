@@ -0,0 +1,27 @@
+"""Generator detector registry"""
+
+import pytest
+
+import PromptSniffer
+
+
+def test_builtin_detectors_are_registered():
+    names = {detector.name for detector in PromptSniffer.DETECTORS}
+    assert {'A1111', 'ComfyUI'} <= names
+
+
+def test_incomplete_detector_fails_at_registration(monkeypatch):
+    monkeypatch.setattr(PromptSniffer, 'DETECTORS', list(PromptSniffer.DETECTORS))
+    monkeypatch.setattr(PromptSniffer, 'DETECTOR_KEYS', set(PromptSniffer.DETECTOR_KEYS))
+
+    with pytest.raises(TypeError):
+        @PromptSniffer.register_detector
+        class HalfDetector(PromptSniffer.GeneratorDetector):
+            name = 'Half'
+            keys = frozenset({'half'})
+
+            def claims(self, values):
+                return True
+
+    assert 'half' not in PromptSniffer.DETECTOR_KEYS
+    assert all(detector.name != 'Half' for detector in PromptSniffer.DETECTORS)
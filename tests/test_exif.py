@@ -0,0 +1,64 @@
+"""The single-pass EXIF parser against Pillow's own reading"""
+
+import io
+
+import pytest
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+import PromptSniffer
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+PARAMETERS = b'ASCII\0\0\0a lighthouse, Steps: 20, Sampler: Euler'
+
+
+def sample_exif():
+    exif = Image.Exif()
+    exif[0x0131] = 'ComfyUI'  # Software
+    exif[0x011A] = IFDRational(72, 1)  # XResolution
+    exif.get_ifd(EXIF_IFD)[0x9286] = PARAMETERS  # UserComment
+    gps = exif.get_ifd(GPS_IFD)
+    gps[1] = 'N'
+    gps[2] = (IFDRational(51, 1), IFDRational(30, 1), IFDRational(1234, 100))
+    return exif
+
+
+def pillow_tags(data):
+    """Tags as Pillow names them, with the EXIF IFD merged in as _getexif() does"""
+    names = PromptSniffer.exif_tag_tables()[0]
+    with Image.open(io.BytesIO(data)) as img:
+        exif = img.getexif()
+        tags = {names.get(tag, tag): value for tag, value in exif.items()}
+        tags.update((names.get(tag, tag), value) for tag, value in exif.get_ifd(EXIF_IFD).items())
+        gps = exif.get_ifd(GPS_IFD)
+        if gps:
+            tags['GPSInfo'] = dict(gps)
+    return tags
+
+
+@pytest.mark.parametrize('image_format', ['PNG', 'JPEG', 'TIFF'])
+@pytest.mark.parametrize('details', [True, False])
+def test_parser_matches_pillow(image_format, details):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, image_format, exif=sample_exif())
+    data = buffer.getvalue()
+
+    expected = pillow_tags(data)
+    ours = PromptSniffer.ExifMetadataProcessor().read_metadata(data, details=details)
+
+    for name, value in expected.items():
+        assert ours.get(name) == value, name
+    if image_format != 'TIFF':  # Pillow's TIFF writer drops the EXIF and GPS IFDs
+        assert ours['UserComment'] == PARAMETERS
+        assert ours['GPSInfo'][2] == (51.0, 30.0, 12.34)
+
+
+def test_fast_mode_still_detects_jpeg_parameters():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'JPEG', exif=sample_exif())
+    processor = PromptSniffer.ExifMetadataProcessor()
+    exif_data = processor.read_metadata(buffer.getvalue(), details=False)
+
+    assert exif_data['EXIF UserComment'] == 'a lighthouse, Steps: 20, Sampler: Euler'
+    assert 'UserComment' in processor.find_ai_generation_metadata(exif_data)
@@ -0,0 +1,29 @@
+"""Unique sidecar and backup names"""
+
+import PromptSniffer
+
+
+def test_names_stay_unique_within_a_directory(tmp_path):
+    (tmp_path / 'a.txt').write_text('')
+    processor = PromptSniffer.ExifMetadataProcessor()
+    base = str(tmp_path / 'a.txt')
+
+    names = [processor.get_unique_filename(base) for _ in range(3)]
+    assert names == [str(tmp_path / f'a_{i}.txt') for i in (1, 2, 3)]
+
+
+def test_directory_listings_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(PromptSniffer.ExifMetadataProcessor, 'MAX_LISTED_DIRS', 4)
+    processor = PromptSniffer.ExifMetadataProcessor()
+    first = tmp_path / 'd0'
+    for i in range(10):
+        directory = tmp_path / f'd{i}'
+        directory.mkdir()
+        path, f = processor._create_unique_file(str(directory / 'a.txt'))
+        f.close()
+    assert len(processor._dir_names) == 4
+
+    # An evicted directory is listed again, so names created earlier are still seen
+    path, f = processor._create_unique_file(str(first / 'a.txt'))
+    f.close()
+    assert path == str(first / 'a_1.txt')
@@ -0,0 +1,69 @@
+"""Memory limits on metadata read from untrusted files"""
+
+import io
+
+import pytest
+
+import PromptSniffer
+from conftest import jpeg_bytes, png_header_bytes, tiff_block, value_offset
+
+IMAGE_DESCRIPTION = 0x010E
+
+
+def tiff_with_description(text):
+    """TIFF structure whose only tag is an out-of-line ImageDescription"""
+    return tiff_block([(IMAGE_DESCRIPTION, 2, len(text), value_offset(1))], text)
+
+
+def test_tiff_metadata_size_counts_out_of_line_values():
+    data = tiff_with_description(b'x' * 1000)
+    assert PromptSniffer.tiff_metadata_size(io.BytesIO(data)) == 8 + 18 + 1000
+
+
+@pytest.mark.parametrize('use_mmap', [True, False])
+def test_oversized_tiff_tag_is_skipped_before_reading(tmp_path, use_mmap):
+    path = tmp_path / 'big.tif'
+    path.write_bytes(tiff_with_description(b'x' * (2 << 20)))
+
+    processor = PromptSniffer.ExifMetadataProcessor(max_metadata_bytes=1 << 20, use_mmap=use_mmap)
+    with pytest.raises(PromptSniffer.LimitExceeded):
+        processor.read_metadata(str(path))
+
+    unlimited = PromptSniffer.ExifMetadataProcessor(max_metadata_bytes=0, use_mmap=use_mmap)
+    assert unlimited.read_metadata(str(path))['ImageDescription'].startswith('xxx')
+
+
+def test_app11_segments_are_capped_in_total():
+    data = jpeg_bytes([(PromptSniffer.JPEG_APP11, b'J' * 60000)] * 4)
+    with pytest.raises(PromptSniffer.LimitExceeded):
+        PromptSniffer.read_jpeg_metadata_segments(io.BytesIO(data), max_bytes=200000)
+    _, jumbf = PromptSniffer.read_jpeg_metadata_segments(io.BytesIO(data), max_bytes=0)
+    assert len(jumbf) == 240000
+
+
+@pytest.mark.parametrize('max_pixels', [0, 300_000_000])
+def test_max_pixels_overrides_pillow_bomb_limit(max_pixels):
+    from PIL import Image
+
+    processor = PromptSniffer.ExifMetadataProcessor(max_pixels=max_pixels)
+    pillow_limit = Image.MAX_IMAGE_PIXELS
+    # 200M pixels is over Pillow's own limit; decoding then fails on the missing pixel data
+    with pytest.raises(OSError, match='truncated'):
+        processor._reencode_without_metadata(io.BytesIO(png_header_bytes(20000, 10000)), io.BytesIO())
+    assert Image.MAX_IMAGE_PIXELS == pillow_limit
+
+
+def test_max_pixels_is_enforced_from_the_header():
+    processor = PromptSniffer.ExifMetadataProcessor(max_pixels=1_000_000)
+    with pytest.raises(PromptSniffer.LimitExceeded):
+        processor._reencode_without_metadata(io.BytesIO(png_header_bytes(2000, 1000)), io.BytesIO())
+
+
+def test_library_scan_does_not_map_files(tmp_path, monkeypatch):
+    path = tmp_path / 'large.tif'
+    path.write_bytes(tiff_block([(0x010E, 2, 4, b'tif\0')], b'\0' * (2 << 20)))
+    monkeypatch.setattr(PromptSniffer, '_default_processor', None)
+    monkeypatch.setattr(PromptSniffer, 'map_file', lambda *args: pytest.fail('scan() mapped the file'))
+    result = PromptSniffer.scan(str(path))
+    assert not result.error
+    assert result.exif_data['Image ImageDescription'] == 'tif'
@@ -0,0 +1,50 @@
+"""End-of-run summary totals"""
+
+import json
+import os
+import sys
+
+import pytest
+
+import PromptSniffer
+from conftest import write_png
+
+
+def test_formats_are_sniffed_not_taken_from_extension(tmp_path):
+    misnamed = write_png(tmp_path / 'render.jpg')
+    report = PromptSniffer.BatchReport()
+
+    report.add(misnamed, ({}, {}, {}))
+    report.add(str(tmp_path / 'missing.png'), None, 'No such file')
+
+    assert report.formats == {'png': 1, 'other': 1}
+
+
+def test_removal_from_clean_file_is_reclaimed(tmp_path):
+    path = write_png(tmp_path / 'holiday.png', {'Comment': 'x' * 1000})
+    size_before = os.path.getsize(path)
+    with open(path, 'rb') as src, open(tmp_path / 'out.png', 'wb') as dst:
+        PromptSniffer.strip_png_chunks(src, dst)
+    os.replace(tmp_path / 'out.png', path)
+
+    report = PromptSniffer.BatchReport()
+    report.add(path, ({'Comment': 'x' * 1000}, {}, {}), size_before=size_before)
+
+    assert report.verdicts == {'clean': 1}
+    assert report.bytes_reclaimed == size_before - os.path.getsize(path) > 1000
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_corrupt_file_is_an_error_not_clean(tmp_path, monkeypatch, capsys, jobs):
+    corrupt = tmp_path / 'bad.png'
+    corrupt.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\0' * 64)
+    clean = write_png(tmp_path / 'clean.png')
+    records = tmp_path / 'records.jsonl'
+    monkeypatch.setattr(sys, 'argv', ['PromptSniffer', '--fail-on', 'error', '--format', 'jsonl', '-o', str(records),
+                                      '--report', str(tmp_path / 'report.json'), '-j', jobs, str(corrupt), clean])
+
+    assert PromptSniffer.main() == PromptSniffer.EXIT_FILES_FAILED
+    report = json.loads((tmp_path / 'report.json').read_text())
+    assert report['verdicts'] == {'error': 1, 'clean': 1}
+    first = json.loads(records.read_text().splitlines()[0])
+    assert first['path'] == str(corrupt) and first['error']
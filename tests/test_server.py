@@ -0,0 +1,74 @@
+"""Request validation in the --serve daemon"""
+
+import http.client
+import http.server
+import json
+import threading
+
+import pytest
+
+import PromptSniffer
+
+
+@pytest.fixture
+def server():
+    service = PromptSniffer.ScanService(PromptSniffer.ExifMetadataProcessor(use_mmap=False), workers=2,
+                                        max_pending=4)
+    handler = type('Handler', (PromptSniffer.ScanRequestHandler, http.server.BaseHTTPRequestHandler),
+                   {'service': service, 'verbose': False})
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    handler.allowed_hosts = {f'127.0.0.1:{httpd.server_address[1]}'}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def post(address, headers, body=b''):
+    connection = http.client.HTTPConnection(*address, timeout=5)
+    connection.putrequest('POST', '/scan')
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    status, payload = response.status, json.loads(response.read() or b'null')
+    connection.close()
+    return status, payload
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_bad_content_length_is_rejected(server, length):
+    status, payload = post(server, {'Content-Type': 'application/json', 'Content-Length': length})
+    assert status == 400 and 'Content-Length' in payload['error']
+
+
+def test_batch_larger_than_the_pending_limit_is_rejected(server):
+    body = json.dumps({'paths': ['a.png'] * 5}).encode()
+    status, _ = post(server, {'Content-Type': 'application/json', 'Content-Length': str(len(body))}, body)
+    assert status == 413
+
+    body = json.dumps({'paths': ['missing.png'] * 4}).encode()
+    status, payload = post(server, {'Content-Type': 'application/json', 'Content-Length': str(len(body))}, body)
+    assert status == 200 and len(payload['results']) == 4
+
+
+def test_run_batch_counts_items_not_requests():
+    service = PromptSniffer.ScanService(PromptSniffer.ExifMetadataProcessor(), workers=3, max_pending=3)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(item):
+        started.set()
+        release.wait(5)
+        return {}
+
+    thread = threading.Thread(target=service.run_batch, args=(slow, [1, 2]))
+    thread.start()
+    started.wait(5)
+    assert service.run_batch(lambda item: {}, [1, 2]) is None
+    assert service.run_batch(lambda item: {'ok': item}, [1]) == [{'ok': 1}]
+    release.set()
+    thread.join()
+    service.shutdown()